@@ -1,15 +1,81 @@
+from django import forms
 from django.contrib import admin
 
-from .models import CustomUser, Balance
+from courses.models import Course, count_subquery
+from .ledger import credit, debit
+from .models import CustomUser, Balance, PointsEntry
 
 
 @admin.register(CustomUser)
 class CustomUserAdmin(admin.ModelAdmin):
-    list_display = ['id', 'username', 'email', 'is_staff', 'is_active']
+    list_display = ['id', 'username', 'email', 'courses_count', 'is_staff', 'is_active']
     search_fields = ['username', 'email']
     list_filter = ['is_staff', 'is_active']
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # A correlated COUNT, only evaluated for the rows on the page
+        return super().get_queryset(request).annotate(courses_count=count_subquery(Course.objects.all(), 'author'))
+
+    @admin.display(description='Courses')
+    def courses_count(self, user):
+        return user.courses_count
 
 
 @admin.register(Balance)
 class BalanceAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'points']
+    list_select_related = ['user']
+    show_full_result_count = False
+    search_fields = ['user__username', 'user__email']
+    autocomplete_fields = ['user']
+    # Materialized from the points ledger, see `manage.py reconcile_points`
+    readonly_fields = ['points']
+
+
+class PointsEntryForm(forms.ModelForm):
+    ''' A points purchase or adjustment, negative amounts are debits '''
+    kind = forms.ChoiceField(choices=[
+        (kind, label) for kind, label in PointsEntry.KINDS if kind in (PointsEntry.PURCHASE, PointsEntry.ADJUSTMENT)
+    ])
+
+    class Meta:
+        model = PointsEntry
+        fields = ['user', 'amount', 'kind']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        user, amount = cleaned_data.get('user'), cleaned_data.get('amount')
+        if amount == 0:
+            self.add_error('amount', 'The amount cannot be zero')
+        elif user is not None and amount is not None and amount < 0:
+            if not Balance.objects.filter(user=user, points__gte=-amount).exists():
+                self.add_error('amount', 'Not enough points')
+        return cleaned_data
+
+
+@admin.register(PointsEntry)
+class PointsEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'amount', 'kind', 'enrollment', 'created_at']
+    list_filter = ['kind']
+    list_select_related = ['user', 'enrollment']
+    show_full_result_count = False
+    search_fields = ['user__username', 'user__email']
+    raw_id_fields = ['user']
+    readonly_fields = ['enrollment', 'created_at']
+    form = PointsEntryForm
+
+    # Append-only, entries are only added through the ledger, which moves
+    # the balance with them
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        if obj.amount > 0:
+            entry = credit(obj.user_id, obj.amount, obj.kind)
+        else:
+            entry = debit(obj.user_id, -obj.amount, obj.kind)
+        obj.pk, obj.created_at = entry.pk, entry.created_at
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import CustomUser
+
+
+def user_cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def resolve_user(user_id):
+    '''
+    User by id with its ``balance_pk`` and ``subscription_pk``, cached for
+    AUTH_USER_CACHE_TIMEOUT seconds. None when there is no such user.
+    '''
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = (
+            CustomUser.objects
+            .annotate(balance_pk=F('balance__pk'), subscription_pk=F('subscription__pk'))
+            .filter(pk=user_id)
+            .first()
+        )
+        if user is not None:
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_user_on_commit(user_id):
+    # Deleting before commit would let a concurrent request cache the old row
+    transaction.on_commit(lambda: cache.delete(user_cache_key(user_id)))
+
+
+class CachedModelBackend(ModelBackend):
+    '''
+    ModelBackend whose session lookups go through resolve_user
+    '''
+    def get_user(self, user_id):
+        user = resolve_user(user_id)
+        return user if self.user_can_authenticate(user) else None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    '''
+    JWTAuthentication resolving the token's user through resolve_user
+    '''
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        user = resolve_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Balance, PointsEntry
+
+
+class InsufficientPoints(Exception):
+    pass
+
+
+def credit(user_id, amount, kind, enrollment=None):
+    '''
+    Append a credit to the user's ledger and add it to their balance
+    '''
+    with transaction.atomic():
+        entry = PointsEntry.objects.create(user_id=user_id, amount=amount, kind=kind, enrollment=enrollment)
+        Balance.objects.filter(user_id=user_id).update(points=F('points') + amount)
+    return entry
+
+
+def charge(user_id, amount):
+    '''
+    Take ``amount`` from the user's balance if it covers it. The check, the
+    row lock and the write are one UPDATE, nothing is read beforehand.
+    Raises InsufficientPoints otherwise. The caller appends the ledger
+    entry in the same transaction.
+    '''
+    if not Balance.objects.filter(user_id=user_id, points__gte=amount).update(points=F('points') - amount):
+        raise InsufficientPoints
+
+
+def debit(user_id, amount, kind, enrollment=None):
+    '''
+    Take ``amount`` from the user's balance and append the debit to their ledger
+    '''
+    with transaction.atomic():
+        charge(user_id, amount)
+        return PointsEntry.objects.create(user_id=user_id, amount=-amount, kind=kind, enrollment=enrollment)
+
+
+def ledger_total():
+    '''
+    Sum of the outer Balance row's ledger entries
+    '''
+    totals = (
+        PointsEntry.objects.filter(user_id=OuterRef('user_id'))
+        .order_by()
+        .values('user_id')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return Coalesce(Subquery(totals), 0)
+
+
+def reconcile(chunk_size=1000):
+    '''
+    Yield ``(user_id, points, ledger_total)`` for every balance that does not
+    match its ledger. Balances are read in user_id order, one query per
+    chunk that reads each balance together with its ledger sum.
+    '''
+    last_user_id = 0
+    while True:
+        chunk = list(
+            Balance.objects.filter(user_id__gt=last_user_id)
+            .order_by('user_id')
+            .annotate(ledger=ledger_total())
+            .values_list('user_id', 'points', 'ledger')[:chunk_size]
+        )
+        if not chunk:
+            return
+        for user_id, points, ledger in chunk:
+            if points != ledger:
+                yield user_id, points, ledger
+        last_user_id = chunk[-1][0]
+
+
+def restore_balances(user_ids):
+    '''
+    Set the balances of ``user_ids`` back to their ledger totals
+    '''
+    return Balance.objects.filter(user_id__in=user_ids).update(points=ledger_total())
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.ledger import reconcile, restore_balances
+
+
+class Command(BaseCommand):
+    help = 'Check every balance against the sum of its points ledger, meant to run periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Balances checked per query')
+        parser.add_argument('--fix', action='store_true', help='Set mismatched balances to their ledger total')
+
+    def handle(self, *args, chunk_size, fix, **options):
+        mismatched = []
+        for user_id, points, total in reconcile(chunk_size):
+            self.stdout.write(self.style.WARNING(f'User {user_id}: balance {points}, ledger {total}'))
+            mismatched.append(user_id)
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('Every balance matches its ledger'))
+        elif fix:
+            restored = restore_balances(mismatched)
+            self.stdout.write(self.style.SUCCESS(f'Restored {restored} balances from their ledger'))
+        else:
+            raise CommandError(f'{len(mismatched)} balances do not match their ledger')
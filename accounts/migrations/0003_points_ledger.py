@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:46
+
+from itertools import islice
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_ledgers(apps, schema_editor):
+    # Existing balances have no history, their current points open the ledger
+    Balance = apps.get_model('accounts', 'Balance')
+    PointsEntry = apps.get_model('accounts', 'PointsEntry')
+    entries = (
+        PointsEntry(user_id=user_id, amount=points, kind='opening')
+        for user_id, points in Balance.objects.order_by('user_id').values_list('user_id', 'points').iterator(chunk_size=1000)
+    )
+    while batch := list(islice(entries, 1000)):
+        PointsEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_balance_user'),
+        ('courses', '0011_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('kind', models.CharField(choices=[('signup', 'Signup grant'), ('opening', 'Opening balance'), ('purchase', 'Purchase'), ('enrollment', 'Course enrollment'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('enrollment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='points_entries', to='courses.subscriptioncourse')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='points_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'points entries',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['user', '-id'], name='pointsentry_user_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
@@ -30,4 +30,41 @@ class Balance(models.Model):
     
     class Meta:
         ordering = ['-id']
-    
\ No newline at end of file
+    
+
+
+class PointsEntry(models.Model):
+    '''
+    Append-only ledger of point credits and debits, Balance.points is their
+    running total
+    '''
+    SIGNUP = 'signup'
+    OPENING = 'opening'
+    PURCHASE = 'purchase'
+    ENROLLMENT = 'enrollment'
+    ADJUSTMENT = 'adjustment'
+    KINDS = [
+        (SIGNUP, 'Signup grant'),
+        (OPENING, 'Opening balance'),
+        (PURCHASE, 'Purchase'),
+        (ENROLLMENT, 'Course enrollment'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    # Leads the (user, -id) index below
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='points_entries', db_index=False)
+    amount = models.IntegerField()
+    kind = models.CharField(max_length=20, choices=KINDS)
+    # The enrollment that was charged, kept when it is removed
+    enrollment = models.ForeignKey(
+        'courses.SubscriptionCourse', on_delete=models.SET_NULL, null=True, blank=True, related_name='points_entries',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name_plural = 'points entries'
+        indexes = [
+            # A user's ledger, newest first, and the per-user sums
+            models.Index(fields=['user', '-id'], name='pointsentry_user_idx'),
+        ]
@@ -1,11 +1,18 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 from accounts.models import CustomUser
-from .models import Balance
+from .auth import invalidate_user_on_commit
+from .models import Balance, PointsEntry
 
 
 @receiver(post_save, sender=CustomUser)
 def post_save_balance(sender, instance: CustomUser, created, **kwargs):
     if created:
-        balance = Balance.objects.create(user=sender)
\ No newline at end of file
+        balance = Balance.objects.create(user=instance)
+        PointsEntry.objects.create(user=instance, amount=balance.points, kind=PointsEntry.SIGNUP)
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_cached_user(sender, instance: CustomUser, **kwargs):
+    invalidate_user_on_commit(instance.pk)
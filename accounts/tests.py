@@ -1,3 +1,228 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+
+from courses.models import Course, Lesson, SubscriptionCourse
+from courses.services import enroll, NotEnoughPoints, AlreadyEnrolled
+from .ledger import credit, reconcile
+from .models import CustomUser, Balance, PointsEntry
+
+
+def create_user(username, **kwargs):
+    return CustomUser.objects.create_user(username=username, email=f'{username}@example.com', **kwargs)
+
+
+class DashboardTest(APITestCase):
+    def setUp(self):
+        self.author = create_user('author')
+        self.student = create_user('student')
+        self.client.force_authenticate(self.student)
+
+    def enroll(self, lessons):
+        course = Course.objects.create(title='Course', author=self.author, price=10)
+        for i in range(lessons):
+            Lesson.objects.create(title=f'Lesson {i}', course=course, video_url='https://example.com/video')
+        self.student.subscription.courses.add(course)
+        return course
+
+    def get_dashboard(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data
+
+    def test_query_count_is_independent_of_courses_and_lessons(self):
+        self.enroll(lessons=1)
+        few_queries, _ = self.get_dashboard()
+
+        for _ in range(5):
+            self.enroll(lessons=10)
+        many_queries, data = self.get_dashboard()
+
+        self.assertEqual(few_queries, many_queries)
+        self.assertEqual(data['enrolled_courses_count'], 6)
+
+    def test_progress_and_balance(self):
+        course = self.enroll(lessons=4)
+        SubscriptionCourse.objects.filter(course=course).update(
+            completed_lessons_count=4, completed_percentage=100, ended_at=course.created_at
+        )
+        self.enroll(lessons=2)
+
+        _, data = self.get_dashboard()
+
+        self.assertEqual(data['balance'], 1000)
+        self.assertEqual(data['completed_courses_count'], 1)
+        self.assertEqual(data['completed_lessons_count'], 4)
+        self.assertEqual(
+            sorted(enrollment['course']['lessons_count'] for enrollment in data['enrolled_courses']),
+            [2, 4],
+        )
+        self.assertNotIn('lessons', data['enrolled_courses'][0]['course'])
+
+
+# Keeps the token requests out of the slow request log
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CachedAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = create_user('student', password='secret-pass')
+
+    def user_queries(self, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return [query for query in ctx.captured_queries if 'FROM "accounts_customuser"' in query['sql']]
+
+    def jwt_header(self):
+        response = self.client.post(
+            reverse('jwt-create'), {'email': 'student@example.com', 'password': 'secret-pass'}, format='json',
+        )
+        return {'authorization': f'JWT {response.data["access"]}'}
+
+    def test_jwt_user_is_cached(self):
+        headers = self.jwt_header()
+
+        self.assertEqual(len(self.user_queries(**headers)), 1)
+        self.assertEqual(self.user_queries(**headers), [])
+
+    def test_session_user_is_cached(self):
+        self.client.force_login(self.student)
+
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+
+    def test_save_invalidates(self):
+        headers = self.jwt_header()
+        self.user_queries(**headers)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.first_name = 'Renamed'
+            self.student.save()
+
+        response = self.client.get(reverse('dashboard'), headers=headers)
+        self.assertEqual(response.data['user']['first_name'], 'Renamed')
+
+    def test_inactive_user_is_rejected(self):
+        headers = self.jwt_header()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.is_active = False
+            self.student.save()
+
+        response = self.client.get(reverse('dashboard'), headers=headers)
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_cached_subscription_is_used(self):
+        course = Course.objects.create(title='Course', author=create_user('author'), price=10)
+        self.student.subscription.courses.add(course)
+        headers = self.jwt_header()
+        self.user_queries(**headers)
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(reverse('dashboard'), headers=headers).data
+
+        self.assertEqual(data['enrolled_courses_count'], 1)
+        self.assertFalse([query for query in ctx.captured_queries if 'courses_subscription"' in query['sql']])
+
+
+class PointsLedgerTest(APITestCase):
+    def setUp(self):
+        self.student = create_user('student')
+        self.course = Course.objects.create(title='Course', author=create_user('author'), price=300)
+
+    def points(self):
+        return Balance.objects.get(user=self.student).points
+
+    def test_signup_opens_the_ledger(self):
+        entry = PointsEntry.objects.get(user=self.student)
+
+        self.assertEqual((entry.kind, entry.amount), (PointsEntry.SIGNUP, 1000))
+        self.assertEqual(list(reconcile()), [])
+
+    def test_enrollment_is_debited(self):
+        enrollment = enroll(self.student, self.course)
+
+        entry = PointsEntry.objects.filter(user=self.student).first()
+        self.assertEqual((entry.kind, entry.amount, entry.enrollment), (PointsEntry.ENROLLMENT, -300, enrollment))
+        self.assertEqual(self.points(), 700)
+        self.assertEqual(list(reconcile()), [])
+
+    def test_failed_enrollments_leave_no_entry(self):
+        enroll(self.student, self.course)
+        with self.assertRaises(AlreadyEnrolled):
+            enroll(self.student, self.course)
+        expensive = Course.objects.create(title='Expensive', author=self.course.author, price=5000)
+        with self.assertRaises(NotEnoughPoints):
+            enroll(self.student, expensive)
+
+        self.assertEqual(self.points(), 700)
+        self.assertEqual(PointsEntry.objects.filter(user=self.student).count(), 2)
+
+    def test_reconcile_reports_and_restores_drift(self):
+        others = [create_user(f'other{i}') for i in range(3)]
+        Balance.objects.filter(user=others[1]).update(points=5)
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_points', chunk_size=2, stdout=StringIO())
+        call_command('reconcile_points', chunk_size=2, fix=True, stdout=StringIO())
+
+        self.assertEqual(Balance.objects.get(user=others[1]).points, 1000)
+        self.assertEqual(list(reconcile(chunk_size=2)), [])
+
+    def test_ledger_pages_newest_first(self):
+        for amount in (10, 20, 30):
+            credit(self.student.pk, amount, PointsEntry.PURCHASE)
+        credit(self.course.author_id, 50, PointsEntry.PURCHASE)
+        self.client.force_authenticate(self.student)
+
+        first = self.client.get(reverse('points-ledger'), {'page_size': 2}).data
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(first['next']).data
+
+        amounts = [entry['amount'] for entry in first['results'] + second['results']]
+        self.assertEqual(amounts, [30, 20, 10, 1000])
+        self.assertIsNone(second['next'])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(self.points(), 1060)
+
+    def admin_client(self):
+        cache.clear()
+        admin_user = create_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+        return self.client
+
+    def test_admin_adds_through_the_ledger(self):
+        client = self.admin_client()
+        url = reverse('admin:accounts_pointsentry_add')
+
+        response = client.post(url, {'user': self.student.pk, 'amount': 250, 'kind': PointsEntry.PURCHASE})
+        self.assertEqual(response.status_code, 302)
+        response = client.post(url, {'user': self.student.pk, 'amount': -50, 'kind': PointsEntry.ADJUSTMENT})
+        self.assertEqual(response.status_code, 302)
+        response = client.post(url, {'user': self.student.pk, 'amount': -5000, 'kind': PointsEntry.ADJUSTMENT})
+        self.assertContains(response, 'Not enough points')
+
+        self.assertEqual(self.points(), 1200)
+        self.assertEqual(list(reconcile()), [])
+
+    def test_admin_cannot_change_or_delete_entries(self):
+        client = self.admin_client()
+        entry = PointsEntry.objects.get(user=self.student)
+
+        response = client.post(reverse('admin:accounts_pointsentry_change', args=[entry.pk]), {
+            'user': self.student.pk, 'amount': 5, 'kind': PointsEntry.ADJUSTMENT,
+        })
+        self.assertEqual(response.status_code, 403)
+        response = client.post(reverse('admin:accounts_pointsentry_delete', args=[entry.pk]), {'post': 'yes'})
+
+        self.assertEqual(response.status_code, 403)
+        entry.refresh_from_db()
+        self.assertEqual(entry.amount, 1000)
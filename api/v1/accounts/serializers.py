@@ -1,11 +1,18 @@
 from rest_framework import serializers
 
-from accounts.models import CustomUser
+from accounts.models import CustomUser, PointsEntry
+from core.profiling import ProfiledSerializerMixin
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='customuser-detail', read_only=True, lookup_field='id')
     
     class Meta:
         model = CustomUser
         fields = ['url', 'id', 'username', 'email', 'first_name', 'last_name', 'date_joined', 'avatar']
+
+
+class PointsEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PointsEntry
+        fields = ['id', 'amount', 'kind', 'enrollment', 'created_at']
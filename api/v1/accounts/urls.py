@@ -6,5 +6,6 @@ from . import views
 urlpatterns = [
     path('<int:id>', views.CustomUserDetailAPIView.as_view(), name='customuser-detail'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('points/', views.PointsLedgerAPIView.as_view(), name='points-ledger'),
 ]
 
@@ -1,5 +1,6 @@
 from django.shortcuts import redirect
-from django.db.models import Count, Q
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
 
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -9,9 +10,13 @@ from rest_framework.permissions import IsAuthenticated
 
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
-from api.v1.courses.serializers import CourseSerializer
-from accounts.models import CustomUser
-from .serializers import CustomUserSerializer
+from api.v1.courses.pagination import IdCursorPagination
+from api.v1.courses.serializers import CourseSummarySerializer
+from accounts.models import CustomUser, Balance, PointsEntry
+from courses.models import SubscriptionCourse
+from courses.services import user_subscription
+from core.profiling import ProfiledSerializerMixin
+from .serializers import CustomUserSerializer, PointsEntrySerializer
 from .permissions import IsOwnerOfAccount
 
 
@@ -28,13 +33,13 @@ class CustomUserDetailAPIView(APIView):
     @extend_schema(operation_id='Get user details', description='Get user details by ID')
     def get(self, request, id):
         user = self.get_object(id)
-        serializer = CustomUserSerializer(user)
+        serializer = CustomUserSerializer(user, context={'request': request})
         return Response(serializer.data)
     
     @extend_schema(operation_id='Update user details', description='Update user details by ID')
     def put(self, request, id):
         user = self.get_object(id)
-        serializer = CustomUserSerializer(user, data=request.data)
+        serializer = CustomUserSerializer(user, data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -43,7 +48,7 @@ class CustomUserDetailAPIView(APIView):
     @extend_schema(operation_id='Partial update user details', description='Partial update user details by ID')
     def patch(self, request, id):
         user = self.get_object(id)
-        serializer = CustomUserSerializer(user, data=request.data, partial=True)
+        serializer = CustomUserSerializer(user, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -56,11 +61,23 @@ class CustomUserDetailAPIView(APIView):
         return Response(status=204)
 
 
+class EnrolledCourseSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    ''' Course the user is enrolled in, with their progress '''
+    course = CourseSummarySerializer(read_only=True)
+    
+    class Meta:
+        model = SubscriptionCourse
+        fields = ['course', 'started_at', 'ended_at', 'completed_lessons_count', 'completed_percentage']
+
+
 class CustomUserDataSerializer(serializers.Serializer):
     ''' Serializer for custom user data '''
     user = CustomUserSerializer()
+    balance = serializers.IntegerField()
+    enrolled_courses = EnrolledCourseSerializer(many=True)
     enrolled_courses_count = serializers.IntegerField()
-    enrolled_courses_percentage = serializers.IntegerField()
+    completed_courses_count = serializers.IntegerField()
+    completed_lessons_count = serializers.IntegerField()
 
 
 @extend_schema(tags=['Custom Users'], request=None,
@@ -73,15 +90,31 @@ class CustomUserDataSerializer(serializers.Serializer):
 @api_view(['GET'])
 def dashboard(request):
     user = request.user
-    enrolled_courses = user.subscription.courses.all().annotate(
-        completed_lessons_count=Count('lessons', filter=Q(subscriptioncourse__completed_percentage=100))
+    enrollments = SubscriptionCourse.objects.filter(subscription=user_subscription(user))
+    totals = enrollments.aggregate(
+        enrolled_courses_count=Count('pk'),
+        completed_courses_count=Count('pk', filter=Q(ended_at__isnull=False)),
+        completed_lessons_count=Coalesce(Sum('completed_lessons_count'), 0),
     )
     
     data = {
         'user': CustomUserSerializer(user, context={'request': request}).data,
-        'enrolled_courses': CourseSerializer(enrolled_courses, many=True, context={'request': request}).data,
-        'enrolled_courses_count': enrolled_courses.count(),
+        'balance': Balance.objects.filter(user=user).values_list('points', flat=True).first() or 0,
+        'enrolled_courses': EnrolledCourseSerializer(
+            enrollments.select_related('course'), many=True, context={'request': request}
+        ).data,
+        **totals,
     }
     
     return Response(data=data)
-    
\ No newline at end of file
+
+
+@extend_schema(tags=['Custom Users'], responses=PointsEntrySerializer(many=True))
+class PointsLedgerAPIView(APIView):
+    @extend_schema(operation_id='List points ledger', description="Credits and debits of the user's points, newest first")
+    def get(self, request):
+        entries = PointsEntry.objects.filter(user=request.user)
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        serializer = PointsEntrySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import async_views
+
+
+# Served under ASGI in place of the same routes in urls.py
+urlpatterns = [
+    path('', async_views.CourseListView.as_view(), name='course-list'),
+    path('<int:pk>/', async_views.CourseDetailView.as_view(), name='course-detail'),
+    path('<int:pk>/lessons/', async_views.LessonListView.as_view(), name='lesson-list'),
+]
@@ -0,0 +1,105 @@
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from core.db import replica_reads
+from courses.cache import acached_course_response
+from courses.models import Course, Lesson
+from courses.services import enrolled_courses
+from . import views
+from .pagination import CreatedAtCursorPagination, PositionCursorPagination
+from .serializers import CourseSerializer, LessonSerializer, sparse_fields
+
+
+class AsyncReadView(View):
+    '''
+    Serve GET from the async ``aget`` every subclass defines, on the event
+    loop. Authentication, permissions, exception handling and rendering are
+    those of ``api_view``, which also handles every other method. Object
+    permissions are not checked, the course views allow every read.
+    '''
+    api_view = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.api_view is None or not inspect.iscoroutinefunction(getattr(cls, 'aget', None)):
+            raise ImproperlyConfigured(f'{cls.__name__} needs an api_view and an async aget()')
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # SessionAuthentication enforces CSRF itself, as APIView does
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def get(self, request, *args, **kwargs):
+        view = self.api_view()
+        view.args, view.kwargs = args, kwargs
+        request = view.initialize_request(request, *args, **kwargs)
+        view.request = request
+        view.headers = view.default_response_headers
+        try:
+            # Authentication reads the session or token from the database
+            await sync_to_async(view.initial)(request, *args, **kwargs)
+            response = await self.aget(request, *args, **kwargs)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return view.finalize_response(request, response, *args, **kwargs)
+
+    async def forward(self, request, *args, **kwargs):
+        return await sync_to_async(self.api_view.as_view())(request, *args, **kwargs)
+
+    post = put = patch = delete = forward
+
+
+class CourseListView(AsyncReadView):
+    api_view = views.CourseAPIView
+
+    async def aget(self, request):
+        fields = sparse_fields(request)
+        courses = Course.objects.for_list(lessons='lessons' in fields['expand'])
+        paginator = CreatedAtCursorPagination()
+        with replica_reads():
+            # DRF paginators are sync, the page query runs in a worker thread
+            page = await sync_to_async(paginator.paginate_queryset)(courses, request, view=self)
+        # Serializing runs on the event loop, where is_enrolled cannot query
+        enrolled = await sync_to_async(enrolled_courses)(request.user)
+        context = {'request': request, 'enrolled_course_ids': enrolled}
+        serializer = CourseSerializer(page, many=True, context=context, **fields)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class CourseDetailView(AsyncReadView):
+    api_view = views.CourseDetailAPIView
+
+    async def aget(self, request, pk):
+        async def build():
+            try:
+                course = await Course.objects.for_list().aget(pk=pk)
+            except Course.DoesNotExist:
+                raise Http404
+            serializer = CourseSerializer(course, context={'request': request})
+            serializer.fields.pop('is_enrolled')
+            return serializer.data, course.updated_at
+
+        response = await acached_course_response(request, pk, 'detail', build)
+        return await sync_to_async(views.with_enrollment)(response, request.user, pk)
+
+
+class LessonListView(AsyncReadView):
+    api_view = views.LessonAPIView
+
+    async def aget(self, request, pk):
+        async def build():
+            course = await aget_object_or_404(Course, pk=pk)
+            lessons = Lesson.objects.filter(course=course)
+            paginator = PositionCursorPagination()
+            page = await sync_to_async(paginator.paginate_queryset)(lessons, request, view=self)
+            serializer = LessonSerializer(page, many=True, context={'request': request}, **sparse_fields(request))
+            return paginator.get_paginated_response(serializer.data).data, course.updated_at
+
+        return await acached_course_response(request, pk, 'lessons', build)
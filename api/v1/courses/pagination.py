@@ -0,0 +1,67 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    '''
+    Keyset pagination on (created_at, id), newest first
+    '''
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class IdCursorPagination(CreatedAtCursorPagination):
+    '''
+    Keyset pagination on id alone, newest first, for append-only tables
+    '''
+    ordering = ('-id',)
+
+
+class PositionCursorPagination(CreatedAtCursorPagination):
+    '''
+    Keyset pagination on (position, id), lessons in syllabus order
+    '''
+    ordering = ('position', 'id')
+
+
+class RankedPagination(LimitOffsetPagination):
+    '''
+    Offset pages over ranked search results. Fetches one extra result to
+    tell whether there is a next page instead of counting every match.
+    '''
+    default_limit = 20
+    max_limit = 100
+
+    def paginate_search(self, search, request):
+        '''
+        ``search(limit, offset)`` returns the ids of one page of results
+        '''
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        ids = search(self.limit + 1, self.offset)
+        self.has_next = len(ids) > self.limit
+        return ids[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties'].pop('count')
+        schema['required'].remove('count')
+        return schema
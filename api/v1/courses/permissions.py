@@ -18,7 +18,7 @@ class IsOwnerOfGroup(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return obj.course.author == request.user
+        return obj.course.author_id == request.user.pk
 
 
 class IsOwnerOfLesson(permissions.BasePermission):
@@ -28,5 +28,13 @@ class IsOwnerOfLesson(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return obj.course.author == request.user
-    
\ No newline at end of file
+        return obj.course.author_id == request.user.pk
+    
+
+class IsOwnerOfCourseData(IsOwnerOfCourse):
+    '''
+    Is requested user the owner of the course, reads included. For the
+    enrollment and progress data of the course.
+    '''
+    def has_object_permission(self, request, view, obj):
+        return obj.author_id == request.user.pk
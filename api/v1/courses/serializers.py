@@ -3,24 +3,80 @@ from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field
 
 from api.v1.accounts.serializers import CustomUserSerializer
+from core.profiling import ProfiledSerializerMixin
 from courses.models import Course, Lesson, Group
+from courses.services import enrolled_courses
 
 
-class LessonSerializer(serializers.ModelSerializer):
+def query_param_list(request, name):
+    '''
+    Comma separated query parameter as a list, or None when it is absent
+    '''
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def sparse_fields(request):
+    '''
+    ``fields`` and ``expand`` kwargs for a SparseFieldsMixin serializer on list endpoints
+    '''
+    return {
+        'fields': query_param_list(request, 'fields'),
+        'expand': query_param_list(request, 'expand') or [],
+    }
+
+
+class SparseFieldsMixin:
+    '''
+    Keep only the requested ``fields`` and collapse every ``expandable_fields``
+    entry that is not listed in ``expand``. A collapsed field is dropped, or
+    replaced by the field its factory returns.
+    '''
+    expandable_fields = {}
+    
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        if expand is not None:
+            for name, collapsed in self.expandable_fields.items():
+                if name in expand:
+                    continue
+                if collapsed is None:
+                    self.fields.pop(name, None)
+                else:
+                    self.fields[name] = collapsed()
+        
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class LessonSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Lesson
         fields = '__all__'
+        # Set from the URL on create. Moving a lesson to another course would
+        # leave both courses' lessons_count wrong.
+        read_only_fields = ['course']
         
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='course-detail', read_only=True, lookup_field='pk')
     author = CustomUserSerializer(read_only=True)
     lessons = LessonSerializer(many=True, read_only=True)
     students_count = serializers.SerializerMethodField()
     lessons_count = serializers.SerializerMethodField()
+    is_enrolled = serializers.SerializerMethodField()
     
     completed_lessons_count = serializers.IntegerField(read_only=True)
     
+    expandable_fields = {
+        'author': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'lessons': None,
+    }
+    
     class Meta:
         model = Course
         fields = '__all__'
@@ -33,13 +89,150 @@ class CourseSerializer(serializers.ModelSerializer):
     @extend_schema_field(field=serializers.IntegerField, component_name='Number of lessons in the course')
     def get_lessons_count(self, obj):
         return obj.get_lessons_count
+    
+    @extend_schema_field(field=serializers.BooleanField, component_name='Whether the requesting user is enrolled')
+    def get_is_enrolled(self, obj):
+        # Looked up once per response, nested and listed courses share it
+        enrolled = self.context.get('enrolled_course_ids')
+        if enrolled is None:
+            request = self.context.get('request')
+            enrolled = enrolled_courses(request.user) if request else frozenset()
+            self.context['enrolled_course_ids'] = enrolled
+        return obj.pk in enrolled
 
 
-class GroupSerializer(serializers.ModelSerializer):
-    course = CourseSerializer(read_only=True)
-    members = CustomUserSerializer(many=True, read_only=True)
+class CourseSummarySerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    ''' Course without nested author, lessons or computed fields '''
+    url = serializers.HyperlinkedIdentityField(view_name='course-detail', read_only=True, lookup_field='pk')
+    
+    class Meta:
+        model = Course
+        fields = ['url', 'id', 'title', 'price', 'lessons_count']
+
+
+class GroupSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    ''' Group with its member count, members are listed by their own endpoint '''
+    course = CourseSummarySerializer(read_only=True)
     
     class Meta:
         model = Group
-        fields = '__all__'
-    
\ No newline at end of file
+        exclude = ['members']
+    
+
+# Users enrolled by one request, whether listed or members of a group
+BULK_ENROLL_LIMIT = 10000
+
+
+class BulkEnrollSerializer(serializers.Serializer):
+    ''' Users to enroll, by ID list or by group '''
+    user_ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=BULK_ENROLL_LIMIT)
+    group_id = serializers.IntegerField(required=False)
+    
+    def validate(self, attrs):
+        if ('user_ids' in attrs) == ('group_id' in attrs):
+            raise serializers.ValidationError('Provide either user_ids or group_id')
+        return attrs
+
+
+class BulkEnrollFailureSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+    detail = serializers.CharField()
+
+
+class BulkEnrollResultSerializer(serializers.Serializer):
+    enrolled = serializers.ListField(child=serializers.IntegerField())
+    failed = BulkEnrollFailureSerializer(many=True)
+
+
+class SyllabusLessonSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    position = serializers.IntegerField()
+
+
+class LessonMoveSerializer(serializers.Serializer):
+    ''' Lesson to move the lesson after, null to make it the first one '''
+    after = serializers.IntegerField(allow_null=True)
+
+
+class CatalogLessonSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ['title', 'video_url']
+
+
+class CatalogCourseSerializer(serializers.ModelSerializer):
+    ''' One course of an imported catalog, with its lessons in order '''
+    lessons = CatalogLessonSerializer(many=True, required=False)
+    
+    class Meta:
+        model = Course
+        fields = ['title', 'price', 'lessons']
+
+
+class CatalogImportResultSerializer(serializers.Serializer):
+    courses = serializers.IntegerField()
+    lessons = serializers.IntegerField()
+
+
+class CourseCloneSerializer(serializers.Serializer):
+    ''' Title of the copy, the original title by default '''
+    title = serializers.CharField(max_length=100, required=False)
+
+
+class LessonCompletionSerializer(serializers.Serializer):
+    lesson_id = serializers.IntegerField()
+    completed_at = serializers.DateTimeField(required=False)
+    score = serializers.IntegerField(min_value=0, default=0)
+
+
+class LessonCompletionBatchSerializer(serializers.Serializer):
+    ''' Lessons completed while offline '''
+    completions = LessonCompletionSerializer(many=True, allow_empty=False, max_length=500)
+
+
+class LessonCompletionResultSerializer(serializers.Serializer):
+    lesson_id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=['completed', 'already_completed', 'not_found', 'not_enrolled'])
+
+
+class GroupMembersSerializer(serializers.Serializer):
+    ''' Users to add to or remove from a group '''
+    user_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=10000)
+
+
+class GroupMembersAddedSerializer(serializers.Serializer):
+    added = serializers.ListField(child=serializers.IntegerField())
+    failed = BulkEnrollFailureSerializer(many=True)
+
+
+class GroupMembersRemovedSerializer(serializers.Serializer):
+    removed = serializers.ListField(child=serializers.IntegerField())
+    failed = BulkEnrollFailureSerializer(many=True)
+
+
+class DailyStatsSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    enrollments = serializers.IntegerField()
+    completions = serializers.IntegerField()
+    lesson_completions = serializers.IntegerField()
+    average_score = serializers.FloatField(allow_null=True)
+
+
+class LessonStatsSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    completions = serializers.IntegerField()
+    completion_rate = serializers.FloatField(allow_null=True)
+    average_score = serializers.FloatField(allow_null=True)
+
+
+class CourseAnalyticsSerializer(serializers.Serializer):
+    ''' Course statistics as of updated_until '''
+    enrollments = serializers.IntegerField()
+    completions = serializers.IntegerField()
+    completion_rate = serializers.FloatField(allow_null=True)
+    average_score = serializers.FloatField(allow_null=True)
+    updated_until = serializers.DateTimeField(allow_null=True)
+    daily = DailyStatsSerializer(many=True)
+    lessons = LessonStatsSerializer(many=True)
@@ -5,12 +5,27 @@ from . import views
 
 urlpatterns = [
     path('', views.CourseAPIView.as_view(), name='course-list'),
+    path('search/', views.CourseSearchAPIView.as_view(), name='course-search'),
+    path('import/', views.CatalogImportAPIView.as_view(), name='course-import'),
+    path('lessons/complete/', views.LessonCompletionBatchAPIView.as_view(), name='lesson-complete-batch'),
     path('<int:pk>/', views.CourseDetailAPIView.as_view(), name='course-detail'),
     path('<int:pk>/lessons/', views.LessonAPIView.as_view(), name='lesson-list'),
     path('<int:pk>/lessons/<int:lesson_pk>/', views.LessonDetailAPIView.as_view(), name='lesson-detail'),
+    path('<int:pk>/lessons/<int:lesson_pk>/move/', views.LessonMoveAPIView.as_view(), name='lesson-move'),
+    path('<int:pk>/syllabus/', views.SyllabusAPIView.as_view(), name='course-syllabus'),
     path('<int:pk>/groups/', views.GroupAPIView.as_view(), name='group-list'),
     path('<int:pk>/groups/<int:group_id>/', views.GroupDetailAPIView.as_view(), name='group-detail'),
+    path('<int:pk>/groups/<int:group_id>/members/', views.GroupMembersAPIView.as_view(), name='group-members'),
+    path(
+        '<int:pk>/groups/<int:group_id>/members/remove/',
+        views.GroupMembersRemoveAPIView.as_view(),
+        name='group-members-remove',
+    ),
+    path('<int:pk>/clone/', views.CourseCloneAPIView.as_view(), name='course-clone'),
     path('<int:pk>/enroll/', views.enroll_course, name='enroll-course'),
+    path('<int:pk>/enroll/bulk/', views.BulkEnrollAPIView.as_view(), name='bulk-enroll-course'),
     path('<int:pk>/lessons/<int:lesson_pk>/complete/', views.lesson_complete, name='lesson-complete'),
+    path('<int:pk>/analytics/', views.CourseAnalyticsAPIView.as_view(), name='course-analytics'),
+    path('<int:pk>/export/<str:dataset>/', views.CourseExportAPIView.as_view(), name='course-export'),
 ]
 
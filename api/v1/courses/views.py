@@ -1,36 +1,144 @@
-from django.http import Http404
+import io
+from datetime import datetime, time, timedelta
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.shortcuts import get_object_or_404
 
-from drf_spectacular.utils import extend_schema, OpenApiResponse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 
-from courses.models import Course, Group, Lesson
-from .serializers import CourseSerializer, GroupSerializer, LessonSerializer
-from .permissions import IsOwnerOfCourse, IsOwnerOfGroup, IsOwnerOfLesson
+from accounts.models import CustomUser
+from api.v1.accounts.serializers import CustomUserSerializer
+from core.db import reads_from_replica
+from courses.models import Course, Group, Lesson, SubscriptionCourse, CompletedLesson
+from courses.analytics import course_analytics
+from courses.cache import cached_course_response
+from courses.catalog import JSON, NDJSON, CatalogError, clone_course, import_catalog, read_catalog, spool
+from courses.exports import EXPORTS, FORMATS, export_rows, stream_export
+from courses.search import search_course_ids
+from courses.services import (
+    enroll, bulk_enroll, complete_lessons, enrolled_courses, user_subscription, add_members, remove_members,
+    move_lesson,
+    NotEnoughPoints, AlreadyEnrolled,
+)
+from .serializers import (
+    CourseSerializer, GroupSerializer, LessonSerializer, sparse_fields,
+    BulkEnrollSerializer, BulkEnrollResultSerializer, BULK_ENROLL_LIMIT, CourseAnalyticsSerializer,
+    LessonCompletionBatchSerializer, LessonCompletionResultSerializer,
+    GroupMembersSerializer, GroupMembersAddedSerializer, GroupMembersRemovedSerializer,
+    CatalogCourseSerializer, CatalogImportResultSerializer, CourseCloneSerializer,
+    SyllabusLessonSerializer, LessonMoveSerializer,
+)
+from .permissions import IsOwnerOfCourse, IsOwnerOfCourseData, IsOwnerOfGroup, IsOwnerOfLesson
+from .pagination import CreatedAtCursorPagination, IdCursorPagination, PositionCursorPagination, RankedPagination
+
+
+LIST_PARAMETERS = [
+    OpenApiParameter('cursor', str, description='Cursor returned in the previous page'),
+    OpenApiParameter('page_size', int, description='Number of results per page'),
+    OpenApiParameter('fields', str, description='Comma separated fields to return'),
+    OpenApiParameter('expand', str, description='Comma separated nested fields to expand'),
+]
 
 
 @extend_schema(tags=['Courses'], request=CourseSerializer, responses=CourseSerializer)   
 class CourseAPIView(APIView):
-    @extend_schema(operation_id='List courses', description='List all courses')
+    @extend_schema(operation_id='List courses', description='List all courses', parameters=LIST_PARAMETERS)
+    @reads_from_replica
     def get(self, request):
-        courses = Course.objects.all()
-        serializer = CourseSerializer(courses, many=True, context={'request': request})
-        return Response(serializer.data)
+        fields = sparse_fields(request)
+        courses = Course.objects.for_list(lessons='lessons' in fields['expand'])
+        paginator = CreatedAtCursorPagination()
+        page = paginator.paginate_queryset(courses, request, view=self)
+        serializer = CourseSerializer(page, many=True, context={'request': request}, **fields)
+        return paginator.get_paginated_response(serializer.data)
     
     @extend_schema(operation_id='Create course', description='Create a new course')
     def post(self, request):
-        serializer = CourseSerializer(data=request.data)
+        serializer = CourseSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save(author=request.user)
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
 
+@extend_schema(tags=['Courses'], responses=CourseSerializer)
+class CourseSearchAPIView(APIView):
+    @extend_schema(
+        operation_id='Search courses',
+        description='Courses whose title, author or lesson titles contain every word of the query, best match first',
+        parameters=[
+            OpenApiParameter('q', str, required=True, description='Search query'),
+            OpenApiParameter('limit', int, description='Number of results per page'),
+            OpenApiParameter('offset', int, description='Number of results to skip'),
+            *LIST_PARAMETERS[2:],
+        ],
+    )
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'detail': 'The q parameter is required'}, status=400)
+        fields = sparse_fields(request)
+        paginator = RankedPagination()
+        ids = paginator.paginate_search(
+            lambda limit, offset: search_course_ids(query, limit, offset), request
+        )
+        courses = Course.objects.for_list(lessons='lessons' in fields['expand']).in_bulk(ids)
+        page = [courses[pk] for pk in ids if pk in courses]
+        serializer = CourseSerializer(page, many=True, context={'request': request}, **fields)
+        return paginator.get_paginated_response(serializer.data)
+
+
+CATALOG_FORMATS = {'application/json': JSON, 'application/x-ndjson': NDJSON}
+
+
+@extend_schema(tags=['Courses'], request={
+        'application/json': CatalogCourseSerializer(many=True),
+        'application/x-ndjson': CatalogCourseSerializer,
+    }, responses={
+        201: CatalogImportResultSerializer,
+        400: OpenApiResponse(description='The catalog is invalid, nothing was imported'),
+        415: OpenApiResponse(description='The catalog is neither JSON nor NDJSON'),
+    })
+class CatalogImportAPIView(APIView):
+    @extend_schema(
+        operation_id='Import courses',
+        description='Create courses and their lessons from a JSON array or an NDJSON catalog, '
+                    'received whole before anything is written. The requesting user is the author of every course.',
+    )
+    def post(self, request):
+        # The body is spooled for the importer, request.data would load it whole
+        format = CATALOG_FORMATS.get(request.content_type.partition(';')[0].strip())
+        if format is None:
+            return Response({'detail': 'Send the catalog as application/json or application/x-ndjson'}, status=415)
+        
+        with spool(request.stream or io.BytesIO()) as catalog:
+            try:
+                courses, lessons = import_catalog(read_catalog(catalog, format), request.user)
+            except CatalogError as e:
+                return Response({'detail': str(e)}, status=400)
+        return Response({'courses': courses, 'lessons': lessons}, status=201)
+
+
+def with_enrollment(response, user, course_id):
+    '''
+    Add the user's ``is_enrolled`` to a cached course payload. Enrolling
+    bumps the course version, so the ETag already covers it.
+    '''
+    if response.status_code == 200:
+        response.data = {**response.data, 'is_enrolled': course_id in enrolled_courses(user)}
+    return response
+
+
 @extend_schema(tags=['Course'], request=CourseSerializer, responses=CourseSerializer) 
 class CourseDetailAPIView(APIView):
     permission_classes = [IsAuthenticated, IsOwnerOfCourse]
@@ -40,14 +148,20 @@ class CourseDetailAPIView(APIView):
     
     @extend_schema(operation_id='Get course details', description='Get course details by ID')
     def get(self, request, pk):
-        course = self.get_object(pk)
-        serializer = CourseSerializer(course, context={'request': request})
-        return Response(serializer.data)
+        def build():
+            course = get_object_or_404(Course.objects.for_list(), pk=pk)
+            serializer = CourseSerializer(course, context={'request': request})
+            # The cached payload is shared by every user
+            serializer.fields.pop('is_enrolled')
+            return serializer.data, course.updated_at
+        
+        response = cached_course_response(request, pk, 'detail', build)
+        return with_enrollment(response, request.user, pk)
     
     @extend_schema(operation_id='Update course details', description='Update course details by ID')
     def put(self, request, pk):
         course = self.get_object(pk)
-        serializer = CourseSerializer(course, data=request.data)
+        serializer = CourseSerializer(course, data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -56,7 +170,7 @@ class CourseDetailAPIView(APIView):
     @extend_schema(operation_id='Partial update course details', description='Partial update course details by ID')
     def patch(self, request, pk):
         course = self.get_object(pk)
-        serializer = CourseSerializer(course, data=request.data, partial=True)
+        serializer = CourseSerializer(course, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -78,29 +192,177 @@ class CourseDetailAPIView(APIView):
 @api_view(['POST'])
 def enroll_course(request, pk):
     course = get_object_or_404(Course, pk=pk)
-    user = request.user
-    balance = user.balance
-    if course.price > balance.points:
+    try:
+        enroll(request.user, course)
+    except NotEnoughPoints:
         return Response({'detail': 'Poinsts not enough, Please buy more points'}, status=402)
-    if user.subscription.courses.filter(id=course.id).exists():
+    except AlreadyEnrolled:
         return Response({'detail': 'You are already enrolled in this course'}, status=400)
     
-    user.subscription.courses.add(course)
+    return Response({'detail': 'Course enrolled successfully'}, status=200)
+
+
+@extend_schema(tags=['Course'], request=CourseCloneSerializer, responses={
+        201: CourseSerializer,
+        403: OpenApiResponse(description='Only the author of the course can clone it'),
+        404: OpenApiResponse(description='Course not found')
+    })
+class CourseCloneAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsOwnerOfCourse]
     
-    balance -= course.price
-    balance.save()
+    @extend_schema(operation_id='Clone course', description='Copy a course with all its lessons')
+    def post(self, request, pk):
+        course = get_object_or_404(Course, pk=pk)
+        self.check_object_permissions(request, course)
+        serializer = CourseCloneSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        
+        clone = clone_course(course, request.user, serializer.validated_data.get('title'))
+        clone = Course.objects.for_list().get(pk=clone.pk)
+        return Response(CourseSerializer(clone, context={'request': request}).data, status=201)
+
+
+def failures(failed):
+    return [{'user_id': user_id, 'detail': detail} for user_id, detail in failed.items()]
+
+
+@extend_schema(tags=['Course'], request=BulkEnrollSerializer, responses={
+        200: BulkEnrollResultSerializer,
+        403: OpenApiResponse(description='Only the author of the course can enroll users'),
+        404: OpenApiResponse(description='Course or group not found')
+    })
+class BulkEnrollAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsOwnerOfCourse]
     
-    return Response({'detail': 'Course enrolled successfully'}, status=200)
+    @extend_schema(operation_id='Bulk enroll users', description='Enroll a list of users or the members of a group in a course')
+    def post(self, request, pk):
+        course = get_object_or_404(Course, pk=pk)
+        self.check_object_permissions(request, course)
+        serializer = BulkEnrollSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        
+        user_ids = serializer.validated_data.get('user_ids')
+        if user_ids is None:
+            group = get_object_or_404(Group, pk=serializer.validated_data['group_id'], course=course)
+            user_ids = list(group.members.order_by('pk').values_list('pk', flat=True)[:BULK_ENROLL_LIMIT + 1])
+            if len(user_ids) > BULK_ENROLL_LIMIT:
+                return Response(
+                    {'detail': f'The group has more than {BULK_ENROLL_LIMIT} members, enroll them by user_ids'},
+                    status=400,
+                )
+        
+        enrolled, failed = bulk_enroll(course, user_ids)
+        return Response({
+            'enrolled': enrolled,
+            'failed': failures(failed),
+        })
+
+
+def parse_day(value):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'{value!r} is not an ISO date')
+    return day
+
+
+def parse_bound(value, end=False):
+    '''
+    Aware datetime from an ISO date or datetime. A date ``end`` bound
+    covers that whole day.
+    '''
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'{value!r} is not an ISO date or datetime')
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+@extend_schema(tags=['Course'])
+class CourseExportAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsOwnerOfCourseData]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The output parameter picks the format, not the Accept header
+        return super().perform_content_negotiation(request, force=True)
+
+    @extend_schema(
+        operation_id='Export course data',
+        description='Stream the enrollments or lesson completions of a course as CSV or NDJSON',
+        parameters=[
+            OpenApiParameter('output', str, enum=list(FORMATS), description='File format, csv by default'),
+            OpenApiParameter('since', str, description='ISO date or datetime, inclusive'),
+            OpenApiParameter('until', str, description='ISO date (inclusive) or datetime (exclusive)'),
+        ],
+        responses={(200, 'text/csv'): OpenApiTypes.STR, (200, 'application/x-ndjson'): OpenApiTypes.STR},
+    )
+    def get(self, request, pk, dataset):
+        if dataset not in EXPORTS:
+            raise Http404
+        course = get_object_or_404(Course.objects.only('author_id'), pk=pk)
+        self.check_object_permissions(request, course)
+
+        output = request.query_params.get('output', 'csv')
+        if output not in FORMATS:
+            return Response({'detail': f'output must be one of {", ".join(FORMATS)}'}, status=400)
+        params = request.query_params
+        try:
+            since = parse_bound(params['since']) if 'since' in params else None
+            until = parse_bound(params['until'], end=True) if 'until' in params else None
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+
+        header, rows = export_rows(dataset, course.pk, since, until)
+        asynchronous = isinstance(request._request, ASGIRequest)
+        content_type, chunks = stream_export(output, header, rows, asynchronous)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="course-{course.pk}-{dataset}.{output}"'
+        return response
+
+
+@extend_schema(tags=['Course'], responses={
+        200: CourseAnalyticsSerializer,
+        403: OpenApiResponse(description='Only the author of the course can read its analytics'),
+    })
+class CourseAnalyticsAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsOwnerOfCourseData]
+
+    @extend_schema(
+        operation_id='Get course analytics',
+        description='Daily enrollments, completion rate, lesson drop-off and average scores, from the rollups',
+        parameters=[
+            OpenApiParameter('since', OpenApiTypes.DATE, description='First day of the daily series'),
+            OpenApiParameter('until', OpenApiTypes.DATE, description='Last day of the daily series'),
+        ],
+    )
+    def get(self, request, pk):
+        course = get_object_or_404(Course.objects.only('author_id'), pk=pk)
+        self.check_object_permissions(request, course)
+
+        params = request.query_params
+        try:
+            since = parse_day(params['since']) if 'since' in params else None
+            until = parse_day(params['until']) if 'until' in params else None
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+        return Response(CourseAnalyticsSerializer(course_analytics(course, since, until)).data)
 
 
 @extend_schema(tags=['Groups'], request=GroupSerializer, responses=GroupSerializer)    
 class GroupAPIView(APIView):
-    @extend_schema(operation_id='List groups for a course', description='List all groups for a course')
+    @extend_schema(operation_id='List groups for a course', description='List all groups for a course', parameters=LIST_PARAMETERS)
     def get(self, request, pk):
         course = get_object_or_404(Course, pk=pk)
-        groups = Group.objects.filter(course=course)
-        seraializer = GroupSerializer(groups, many=True, context={'request': request} )
-        return Response(seraializer.data)
+        groups = Group.objects.filter(course=course).select_related('course')
+        paginator = CreatedAtCursorPagination()
+        page = paginator.paginate_queryset(groups, request, view=self)
+        seraializer = GroupSerializer(page, many=True, context={'request': request}, **sparse_fields(request))
+        return paginator.get_paginated_response(seraializer.data)
     
     @extend_schema(operation_id='Create group for a course', description='Create a new group for a course ')
     def post(self, request, pk):
@@ -116,51 +378,111 @@ class GroupAPIView(APIView):
 class GroupDetailAPIView(APIView):
     permission_classes = [IsAuthenticated, IsOwnerOfGroup]
      
-    def get_object(self, pk):
-        return get_object_or_404(Group, pk=pk)
+    def get_object(self, pk, group_id):
+        return get_object_or_404(Group.objects.select_related('course'), pk=group_id, course_id=pk)
     
     @extend_schema(operation_id='Get group details', description='Get group details by ID')
-    def get(self, request, pk):
-        group = self.get_object(pk)
+    def get(self, request, pk, group_id):
+        group = self.get_object(pk, group_id)
         serializer = GroupSerializer(group, context={'request': request})
         return Response(serializer.data)
     
     @extend_schema(operation_id='Update group details', description='Update group details by ID')
-    def put(self, request, pk):
-        group = self.get_object(pk)
-        serializer = GroupSerializer(group, data=request.data)
+    def put(self, request, pk, group_id):
+        group = self.get_object(pk, group_id)
+        serializer = GroupSerializer(group, data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
     
     @extend_schema(operation_id='Partial update group details', description='Partial update group details by ID')
-    def patch(self, request, pk):
-        group = self.get_object(pk)
-        serializer = GroupSerializer(group, data=request.data, partial=True)
+    def patch(self, request, pk, group_id):
+        group = self.get_object(pk, group_id)
+        serializer = GroupSerializer(group, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
     
     @extend_schema(operation_id='Delete group', description='Delete group by ID')
-    def delete(self, request, pk):
-        group = self.get_object(pk)
+    def delete(self, request, pk, group_id):
+        group = self.get_object(pk, group_id)
         group.delete()
         return Response(status=204)
 
 
+class GroupMembersMixin:
+    permission_classes = [IsAuthenticated, IsOwnerOfGroup]
+    
+    def get_group(self, request, pk, group_id):
+        group = get_object_or_404(Group.objects.select_related('course'), pk=group_id, course_id=pk)
+        self.check_object_permissions(request, group)
+        return group
+
+
+@extend_schema(tags=['Groups'], request=GroupMembersSerializer)
+class GroupMembersAPIView(GroupMembersMixin, APIView):
+    @extend_schema(
+        operation_id='List group members', description='List the members of a group, newest users first',
+        responses=CustomUserSerializer(many=True),
+    )
+    def get(self, request, pk, group_id):
+        group = self.get_group(request, pk, group_id)
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(CustomUser.objects.filter(group=group), request, view=self)
+        serializer = CustomUserSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+    
+    @extend_schema(
+        operation_id='Add group members', description='Add a list of users to a group',
+        responses={
+            200: GroupMembersAddedSerializer,
+            403: OpenApiResponse(description='Only the author of the course can change its groups'),
+        },
+    )
+    def post(self, request, pk, group_id):
+        group = self.get_group(request, pk, group_id)
+        serializer = GroupMembersSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        
+        added, failed = add_members(group, serializer.validated_data['user_ids'])
+        return Response({'added': added, 'failed': failures(failed)})
+
+
+@extend_schema(tags=['Groups'], request=GroupMembersSerializer, responses={
+        200: GroupMembersRemovedSerializer,
+        403: OpenApiResponse(description='Only the author of the course can change its groups'),
+    })
+class GroupMembersRemoveAPIView(GroupMembersMixin, APIView):
+    @extend_schema(operation_id='Remove group members', description='Remove a list of users from a group')
+    def post(self, request, pk, group_id):
+        group = self.get_group(request, pk, group_id)
+        serializer = GroupMembersSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        
+        removed, failed = remove_members(group, serializer.validated_data['user_ids'])
+        return Response({'removed': removed, 'failed': failures(failed)})
+
+
 @extend_schema(tags=['Lessons'], request=LessonSerializer, responses=LessonSerializer)     
 class LessonAPIView(APIView):
     def get_object(self, pk):
         return get_object_or_404(Course, pk=pk)
     
-    @extend_schema(operation_id='List lessons for a course', description='List all lessons for a course')
+    @extend_schema(operation_id='List lessons for a course', description='List all lessons for a course', parameters=LIST_PARAMETERS)
     def get(self, request, pk):
-        course = self.get_object(pk)
-        lessons = Lesson.objects.filter(course=course)
-        serializer = LessonSerializer(lessons, many=True, context={'request': request})
-        return Response(serializer.data)
+        def build():
+            course = self.get_object(pk)
+            lessons = Lesson.objects.filter(course=course)
+            paginator = PositionCursorPagination()
+            page = paginator.paginate_queryset(lessons, request, view=self)
+            serializer = LessonSerializer(page, many=True, context={'request': request}, **sparse_fields(request))
+            return paginator.get_paginated_response(serializer.data).data, course.updated_at
+        
+        return cached_course_response(request, pk, 'lessons', build)
     
     @extend_schema(operation_id='Create lesson for a course', description='Create a new lesson for a course')
     def post(self, request, pk):
@@ -176,18 +498,18 @@ class LessonAPIView(APIView):
 class LessonDetailAPIView(APIView):
     permission_classes = [IsAuthenticated, IsOwnerOfLesson]
     
-    def get_object(self, pk):
-        return get_object_or_404(Lesson, pk=pk)
+    def get_object(self, pk, lesson_pk):
+        return get_object_or_404(Lesson.objects.select_related('course'), pk=lesson_pk, course_id=pk)
     
     @extend_schema(operation_id='Get lesson details', description='Get lesson details by ID')
-    def get(self, request, pk):
-        lesson = self.get_object(pk)
+    def get(self, request, pk, lesson_pk):
+        lesson = self.get_object(pk, lesson_pk)
         serializer = LessonSerializer(lesson, context={'request': request})
         return Response(serializer.data)
     
     @extend_schema(operation_id='Update lesson details', description='Update lesson details by ID')
-    def put(self, request, pk):
-        lesson = self.get_object(pk)
+    def put(self, request, pk, lesson_pk):
+        lesson = self.get_object(pk, lesson_pk)
         serializer = LessonSerializer(lesson, data=request.data)
         if serializer.is_valid():
             serializer.save()
@@ -195,8 +517,8 @@ class LessonDetailAPIView(APIView):
         return Response(serializer.errors, status=400)
     
     @extend_schema(operation_id='Partial update lesson details', description='Partial update lesson details by ID')
-    def patch(self, request, pk):
-        lesson = self.get_object(pk)
+    def patch(self, request, pk, lesson_pk):
+        lesson = self.get_object(pk, lesson_pk)
         serializer = LessonSerializer(lesson, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
@@ -204,12 +526,47 @@ class LessonDetailAPIView(APIView):
         return Response(serializer.errors, status=400)
     
     @extend_schema(operation_id='Delete lesson', description='Delete lesson by ID')
-    def delete(self, request, pk):
-        lesson = self.get_object(pk)
+    def delete(self, request, pk, lesson_pk):
+        lesson = self.get_object(pk, lesson_pk)
         lesson.delete()
         return Response(status=204)
     
 
+@extend_schema(tags=['Lessons'], request=LessonMoveSerializer, responses={
+        200: LessonSerializer,
+        400: OpenApiResponse(description='after is not another lesson of this course'),
+        403: OpenApiResponse(description='Only the author of the course can move lessons'),
+        404: OpenApiResponse(description='Lesson not found')
+    })
+class LessonMoveAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsOwnerOfLesson]
+    
+    @extend_schema(operation_id='Move lesson', description='Move a lesson right after another lesson of its course')
+    def post(self, request, pk, lesson_pk):
+        lesson = get_object_or_404(Lesson.objects.select_related('course'), pk=lesson_pk, course_id=pk)
+        self.check_object_permissions(request, lesson)
+        serializer = LessonMoveSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        
+        try:
+            move_lesson(lesson, serializer.validated_data['after'])
+        except Lesson.DoesNotExist:
+            return Response({'detail': 'after must be another lesson of this course'}, status=400)
+        return Response(LessonSerializer(lesson, context={'request': request}).data)
+
+
+@extend_schema(tags=['Lessons'], responses=SyllabusLessonSerializer(many=True))
+class SyllabusAPIView(APIView):
+    @extend_schema(operation_id='Get course syllabus', description='Id, title and position of every lesson, in order')
+    def get(self, request, pk):
+        def build():
+            updated_at = get_object_or_404(Course.objects.values_list('updated_at', flat=True), pk=pk)
+            return list(Lesson.objects.filter(course_id=pk).values('id', 'title', 'position')), updated_at
+        
+        return cached_course_response(request, pk, 'syllabus', build)
+
+
 @extend_schema(tags=['Lessons'], request=None, responses={
     200: OpenApiResponse(description='Lesson completed successfully'),
     403: OpenApiResponse(description='You are not enrolled in this course'),
@@ -217,20 +574,31 @@ class LessonDetailAPIView(APIView):
 }) 
 @api_view(['POST'])
 def lesson_complete(request, pk, lesson_pk):
-    lesson = get_object_or_404(pk=lesson_pk)
-    course = lesson.course
-    user = request.user
-    if not user.subscription.courses.filter(id=course.id).exists():
+    lesson = get_object_or_404(Lesson, pk=lesson_pk, course_id=pk)
+    progress = SubscriptionCourse.objects.filter(subscription=user_subscription(request.user), course_id=lesson.course_id)
+    subscription_course_id = progress.values_list('pk', flat=True).first()
+    if subscription_course_id is None:
         return Response({'detail': 'You are not enrolled in this course'}, status=403)
     
-    progress = user.subscriptioncourse.filter(course=course)
-    progress.completed_lessons.add(lesson)
-    progress.completed_percentage = (progress.completed_lessons.count() / course.lessons.count()) * 100
-    
-    if progress.completed_percentage >= 100:
-        progress.ended_at = timezone.now()
-    
-    progress.save()
+    with transaction.atomic():
+        _, created = CompletedLesson.objects.get_or_create(subscription_course_id=subscription_course_id, lesson=lesson)
+        if created:
+            progress.filter(pk=subscription_course_id).complete_lesson(ended_at=timezone.now())
     
     return Response({'detail': 'Lesson completed successfully'}, status=200)
-    
+
+
+@extend_schema(tags=['Lessons'], request=LessonCompletionBatchSerializer, responses={
+    200: LessonCompletionResultSerializer(many=True),
+})
+class LessonCompletionBatchAPIView(APIView):
+    @extend_schema(
+        operation_id='Complete lessons in bulk',
+        description='Record lessons completed while offline, with a status for each of them',
+    )
+    def post(self, request):
+        serializer = LessonCompletionBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        
+        return Response(complete_lessons(request.user, serializer.validated_data['completions']))
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+
+urlpatterns = [
+    path('slow-requests/', views.slow_request_list, name='slow-request-list'),
+]
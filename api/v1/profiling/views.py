@@ -0,0 +1,36 @@
+from rest_framework import serializers
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from drf_spectacular.utils import extend_schema
+
+from core.profiling import slow_requests
+
+
+class DuplicateQuerySerializer(serializers.Serializer):
+    sql = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class SlowRequestSerializer(serializers.Serializer):
+    ''' Profile of a slow request '''
+    time = serializers.DateTimeField()
+    method = serializers.CharField()
+    path = serializers.CharField()
+    view = serializers.CharField(allow_null=True)
+    status = serializers.IntegerField()
+    total_ms = serializers.FloatField()
+    db_ms = serializers.FloatField()
+    serializer_ms = serializers.FloatField()
+    queries = serializers.IntegerField()
+    duplicates = DuplicateQuerySerializer(many=True)
+
+
+@extend_schema(tags=['Profiling'], request=None, responses=SlowRequestSerializer(many=True),
+               operation_id='List slow requests',
+               description='Slowest of the recent requests that went over PROFILING_SLOW_MS, slowest first')
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def slow_request_list(request):
+    return Response(sorted(slow_requests, key=lambda summary: summary['total_ms'], reverse=True))
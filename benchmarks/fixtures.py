@@ -0,0 +1,87 @@
+import random
+
+from django.utils import timezone
+
+from accounts.models import CustomUser, Balance, PointsEntry
+from courses.models import POSITION_GAP, Course, Lesson, Group, Subscription, SubscriptionCourse, CompletedLesson
+from courses.analytics import rollup
+from courses.search import rebuild_index
+
+
+def build_dataset(users, courses, lessons, enrollments, completion_rate, group_size=10, seed=0):
+    '''
+    Bulk insert ``users`` students, ``courses`` courses of ``lessons`` lessons,
+    ``enrollments`` enrollments per student and completions for
+    ``completion_rate`` of the enrolled lessons. Signals are bypassed, the
+    stored counters, search index and analytics rollups are written directly.
+    '''
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    author = CustomUser.objects.create_user(username='bench-author', email='bench-author@example.com')
+    students = CustomUser.objects.bulk_create([
+        CustomUser(username=f'bench-{i}', email=f'bench-{i}@example.com', password='!')
+        for i in range(users)
+    ])
+    Balance.objects.bulk_create([Balance(user=student, points=10 ** 6) for student in students])
+    PointsEntry.objects.bulk_create([
+        PointsEntry(user=student, amount=10 ** 6, kind=PointsEntry.SIGNUP) for student in students
+    ])
+    subscriptions = Subscription.objects.bulk_create([Subscription(user=student) for student in students])
+
+    course_objs = Course.objects.bulk_create([
+        Course(title=f'Course {i}', author=author, price=10, lessons_count=lessons)
+        for i in range(courses)
+    ])
+    lesson_objs = Lesson.objects.bulk_create([
+        Lesson(
+            title=f'Lesson {j}', course=course, video_url='https://example.com/video', position=(j + 1) * POSITION_GAP,
+        )
+        for course in course_objs
+        for j in range(lessons)
+    ])
+    lessons_by_course = {}
+    for lesson in lesson_objs:
+        lessons_by_course.setdefault(lesson.course_id, []).append(lesson)
+
+    enrollment_objs = []
+    completed = []
+    students_count = dict.fromkeys((course.pk for course in course_objs), 0)
+    for subscription in subscriptions:
+        for course in rng.sample(course_objs, min(enrollments, courses)):
+            done = [lesson for lesson in lessons_by_course.get(course.pk, []) if rng.random() < completion_rate]
+            enrollment = SubscriptionCourse(
+                subscription=subscription,
+                course=course,
+                completed_lessons_count=len(done),
+                completed_percentage=round(100 * len(done) / lessons, 2) if lessons else 0,
+                ended_at=now if lessons and len(done) == lessons else None,
+            )
+            enrollment_objs.append(enrollment)
+            completed.append((enrollment, done))
+            students_count[course.pk] += 1
+    SubscriptionCourse.objects.bulk_create(enrollment_objs, batch_size=1000)
+    CompletedLesson.objects.bulk_create(
+        [
+            CompletedLesson(subscription_course=enrollment, lesson=lesson, score=rng.randint(0, 100))
+            for enrollment, done in completed
+            for lesson in done
+        ],
+        batch_size=1000,
+    )
+    for course in course_objs:
+        Course.objects.filter(pk=course.pk).update(students_count=students_count[course.pk])
+
+    rebuild_index()
+    rollup(until=timezone.now())
+
+    group = Group.objects.create(name='Bench group', course=course_objs[0])
+    group.members.add(*students[:group_size])
+
+    return {
+        'author': author,
+        'students': students,
+        'courses': course_objs,
+        'lessons': lessons_by_course,
+        'group': group,
+    }
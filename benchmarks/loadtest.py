@@ -0,0 +1,118 @@
+import http.client
+import statistics
+import threading
+import time
+from itertools import cycle
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from courses.models import Course
+from .fixtures import build_dataset
+
+
+# Read-heavy routes served by async views under ASGI
+ROUTES = ['course-list', 'course-detail', 'lesson-list']
+
+
+def load_dataset(scale):
+    '''
+    Course ids and a student of the benchmark dataset, built on first use.
+    The servers read the configured database, not a test one.
+    '''
+    author = CustomUser.objects.filter(username='bench-author').first()
+    if author is None:
+        dataset = build_dataset(**scale)
+        return [course.pk for course in dataset['courses']], dataset['students'][0]
+    course_ids = list(Course.objects.filter(author=author).values_list('pk', flat=True)[:100])
+    return course_ids, CustomUser.objects.filter(username__startswith='bench-').exclude(pk=author.pk).first()
+
+
+def session_cookie(user):
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+def request_paths(course_ids):
+    '''
+    One path per route and course, requested in turn by every client
+    '''
+    paths = []
+    for pk in course_ids:
+        paths += [
+            reverse('course-list') + '?page_size=20',
+            reverse('course-detail', args=[pk]),
+            reverse('lesson-list', args=[pk]),
+        ]
+    return paths
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('HEAD', '/')
+            connection.getresponse()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f'Nothing listening on port {port} after {timeout}s')
+
+
+def client(port, paths, cookie, deadline, latencies, errors):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    for path in cycle(paths):
+        if time.monotonic() >= deadline:
+            break
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path, headers={'Cookie': cookie})
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(path)
+            connection.close()
+            continue
+        if response.status != 200:
+            errors.append(path)
+        latencies.append((time.perf_counter() - start) * 1000)
+    connection.close()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_load(port, paths, cookie, concurrency, duration):
+    '''
+    Send ``paths`` from ``concurrency`` keep-alive clients for ``duration``
+    seconds and summarize throughput and latency
+    '''
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=client, args=(port, paths[i::concurrency] or paths, cookie, deadline, latencies, errors))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / duration, 1),
+        'p50': round(statistics.median(latencies), 2) if latencies else None,
+        'p95': round(percentile(latencies, 0.95), 2) if latencies else None,
+        'p99': round(percentile(latencies, 0.99), 2) if latencies else None,
+        'errors': len(errors),
+    }
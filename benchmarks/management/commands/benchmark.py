@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from benchmarks.suite import SCALES, run_suite, load_budgets, check_budgets
+
+
+class Command(BaseCommand):
+    help = 'Measure query count, time and response size of every api/v1 route on a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', action='append', choices=SCALES, help='Dataset scale, repeatable (default: small, medium)')
+        parser.add_argument('--repeat', type=int, default=3, help='Requests per route, the median time is kept')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--no-budgets', action='store_true', help='Report only, do not fail on budget violations')
+
+    def handle(self, *args, scale, repeat, output, no_budgets, **options):
+        scales = scale or ['small', 'medium']
+        budgets = load_budgets()
+        results, violations = {}, []
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for name in scales:
+                with transaction.atomic():
+                    results[name] = run_suite(name, repeat)
+                    transaction.set_rollback(True)
+                violations += [f'[{name}] {violation}' for violation in check_budgets(results[name], budgets)]
+                self.write_table(name, results[name])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if output:
+            with open(output, 'w') as f:
+                json.dump(results, f, indent=2)
+
+        if violations and not no_budgets:
+            raise CommandError('Budget exceeded:\n' + '\n'.join(violations))
+        for violation in violations:
+            self.stdout.write(self.style.WARNING(violation))
+
+    def write_table(self, name, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{name}'))
+        self.stdout.write(f'{"route":<22}{"status":>8}{"queries":>9}{"ms":>10}{"bytes":>10}')
+        for route, result in results.items():
+            self.stdout.write(
+                f'{route:<22}{result["status"]:>8}{result["queries"]:>9}{result["ms"]:>10}{result["bytes"]:>10}'
+            )
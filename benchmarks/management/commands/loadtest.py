@@ -0,0 +1,51 @@
+import shlex
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.loadtest import load_dataset, session_cookie, request_paths, wait_for_server, run_load
+from benchmarks.suite import SCALES
+
+
+SERVERS = {
+    'wsgi': 'gunicorn core.wsgi:application --bind 127.0.0.1:{port} --workers {workers} --threads 8',
+    'asgi': 'uvicorn core.asgi:application --port {port} --workers {workers} --no-access-log',
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput and latency of the read-heavy course routes under WSGI and ASGI servers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', action='append', choices=SERVERS, help='Server to run, repeatable (default: wsgi, asgi)')
+        parser.add_argument('--scale', choices=SCALES, default='medium', help='Dataset scale when none is loaded yet')
+        parser.add_argument('--concurrency', type=int, action='append', help='Concurrent clients, repeatable (default: 1, 10, 50)')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per run')
+        parser.add_argument('--workers', type=int, default=1, help='Server worker processes')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--wsgi-command', default=SERVERS['wsgi'], help='WSGI server command line, {port} and {workers} are filled in')
+        parser.add_argument('--asgi-command', default=SERVERS['asgi'], help='ASGI server command line, {port} and {workers} are filled in')
+
+    def handle(self, *args, server, scale, concurrency, duration, workers, port, **options):
+        course_ids, student = load_dataset(SCALES[scale])
+        cookie = session_cookie(student)
+        paths = request_paths(course_ids)
+
+        self.stdout.write(f'{"server":<8}{"clients":>8}{"requests":>10}{"rps":>9}{"p50":>9}{"p95":>9}{"p99":>9}{"errors":>8}')
+        for name in server or list(SERVERS):
+            command = options[f'{name}_command'].format(port=port, workers=workers)
+            try:
+                process = subprocess.Popen(shlex.split(command))
+            except FileNotFoundError as exc:
+                raise CommandError(f'Cannot start {name} server: {exc}')
+            try:
+                wait_for_server(port)
+                for clients in concurrency or [1, 10, 50]:
+                    result = run_load(port, paths, cookie, clients, duration)
+                    self.stdout.write(
+                        f'{name:<8}{clients:>8}{result["requests"]:>10}{result["rps"]:>9}'
+                        f'{result["p50"]:>9}{result["p95"]:>9}{result["p99"]:>9}{result["errors"]:>8}'
+                    )
+            finally:
+                process.terminate()
+                process.wait()
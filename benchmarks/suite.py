@@ -0,0 +1,232 @@
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+from .fixtures import build_dataset
+
+
+BUDGETS_PATH = Path(__file__).resolve().parent / 'budgets.json'
+
+SCALES = {
+    'small': {'users': 20, 'courses': 10, 'lessons': 5, 'enrollments': 3, 'completion_rate': 0.5},
+    'medium': {'users': 200, 'courses': 100, 'lessons': 10, 'enrollments': 5, 'completion_rate': 0.5},
+    'large': {'users': 2000, 'courses': 1000, 'lessons': 20, 'enrollments': 5, 'completion_rate': 0.5},
+}
+
+SCENARIOS = []
+
+
+def scenario(route, method='get'):
+    '''
+    Register a function that returns ``(user, url, data)`` for one request to ``route``
+    '''
+    def decorator(func):
+        SCENARIOS.append((route, method, func))
+        return func
+    return decorator
+
+
+def fresh_student(dataset):
+    count = CustomUser.objects.count()
+    return CustomUser.objects.create_user(username=f'bench-new-{count}', email=f'bench-new-{count}@example.com')
+
+
+@scenario('course-list')
+def course_list(dataset):
+    return dataset['students'][0], reverse('course-list'), {'expand': 'lessons,author'}
+
+
+@scenario('course-search')
+def course_search(dataset):
+    return dataset['students'][0], reverse('course-search'), {'q': 'course lesson', 'expand': 'lessons,author'}
+
+
+@scenario('course-detail')
+def course_detail(dataset):
+    return dataset['students'][0], reverse('course-detail', args=[dataset['courses'][0].pk]), None
+
+
+@scenario('lesson-list')
+def lesson_list(dataset):
+    return dataset['students'][0], reverse('lesson-list', args=[dataset['courses'][0].pk]), None
+
+
+@scenario('lesson-detail')
+def lesson_detail(dataset):
+    lesson = dataset['lessons'][dataset['courses'][0].pk][0]
+    return dataset['students'][0], reverse('lesson-detail', args=[lesson.course_id, lesson.pk]), None
+
+
+@scenario('lesson-move', 'post')
+def lesson_move(dataset):
+    first, *_, last = dataset['lessons'][dataset['courses'][-1].pk]
+    return dataset['author'], reverse('lesson-move', args=[last.course_id, last.pk]), {'after': first.pk}
+
+
+@scenario('course-syllabus')
+def course_syllabus(dataset):
+    return dataset['students'][0], reverse('course-syllabus', args=[dataset['courses'][0].pk]), None
+
+
+@scenario('group-list')
+def group_list(dataset):
+    return dataset['author'], reverse('group-list', args=[dataset['group'].course_id]), None
+
+
+@scenario('group-detail')
+def group_detail(dataset):
+    group = dataset['group']
+    return dataset['author'], reverse('group-detail', args=[group.course_id, group.pk]), None
+
+
+@scenario('group-members')
+def group_members(dataset):
+    group = dataset['group']
+    return dataset['author'], reverse('group-members', args=[group.course_id, group.pk]), None
+
+
+@scenario('group-members-remove', 'post')
+def group_members_remove(dataset):
+    group = dataset['group']
+    user_ids = [fresh_student(dataset).pk for _ in range(10)]
+    group.members.add(*user_ids)
+    return dataset['author'], reverse('group-members-remove', args=[group.course_id, group.pk]), {'user_ids': user_ids}
+
+
+@scenario('enroll-course', 'post')
+def enroll_course(dataset):
+    return fresh_student(dataset), reverse('enroll-course', args=[dataset['courses'][0].pk]), None
+
+
+@scenario('bulk-enroll-course', 'post')
+def bulk_enroll_course(dataset):
+    user_ids = [fresh_student(dataset).pk for _ in range(10)]
+    return dataset['author'], reverse('bulk-enroll-course', args=[dataset['courses'][-1].pk]), {'user_ids': user_ids}
+
+
+@scenario('lesson-complete', 'post')
+def lesson_complete(dataset):
+    student = fresh_student(dataset)
+    course = dataset['courses'][0]
+    student.subscription.courses.add(course)
+    lesson = dataset['lessons'][course.pk][0]
+    return student, reverse('lesson-complete', args=[course.pk, lesson.pk]), None
+
+
+@scenario('lesson-complete-batch', 'post')
+def lesson_complete_batch(dataset):
+    student = fresh_student(dataset)
+    courses = dataset['courses'][:2]
+    student.subscription.courses.add(*courses)
+    lessons = [lesson for course in courses for lesson in dataset['lessons'][course.pk]]
+    return student, reverse('lesson-complete-batch'), {
+        'completions': [{'lesson_id': lesson.pk, 'score': 80} for lesson in lessons],
+    }
+
+
+@scenario('course-import', 'post')
+def course_import(dataset):
+    lessons = [{'title': f'Imported lesson {i}', 'video_url': 'https://example.com/video'} for i in range(10)]
+    courses = [{'title': f'Imported course {i}', 'price': '10.00', 'lessons': lessons} for i in range(50)]
+    return dataset['author'], reverse('course-import'), courses
+
+
+@scenario('course-clone', 'post')
+def course_clone(dataset):
+    return dataset['author'], reverse('course-clone', args=[dataset['courses'][0].pk]), {'title': 'Cloned course'}
+
+
+@scenario('course-analytics')
+def course_analytics(dataset):
+    return dataset['author'], reverse('course-analytics', args=[dataset['courses'][0].pk]), None
+
+
+@scenario('course-export')
+def course_export(dataset):
+    return dataset['author'], reverse('course-export', args=[dataset['courses'][0].pk, 'completions']), None
+
+
+@scenario('customuser-detail')
+def customuser_detail(dataset):
+    student = dataset['students'][0]
+    return student, reverse('customuser-detail', args=[student.pk]), None
+
+
+@scenario('dashboard')
+def dashboard(dataset):
+    return dataset['students'][0], reverse('dashboard'), None
+
+
+@scenario('points-ledger')
+def points_ledger(dataset):
+    return dataset['students'][0], reverse('points-ledger'), None
+
+
+def is_transaction_control(query):
+    # Savepoints only appear when running inside a test transaction
+    return query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'))
+
+
+def measure(route, method, build, dataset, repeat):
+    client = APIClient()
+    timings = []
+    for _ in range(repeat):
+        user, url, data = build(dataset)
+        client.force_authenticate(user)
+        # Measure the uncached path
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            if method == 'get':
+                response = client.get(url, data)
+            else:
+                response = getattr(client, method)(url, data, format='json')
+            # Streamed bodies are produced while they are read
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'status': response.status_code,
+        'queries': len([query for query in ctx.captured_queries if not is_transaction_control(query)]),
+        'ms': round(statistics.median(timings), 2),
+        'bytes': len(content),
+    }
+
+
+def run_suite(scale, repeat=3):
+    '''
+    Build the dataset for ``scale`` and measure every scenario against it
+    '''
+    dataset = build_dataset(**SCALES[scale])
+    return {route: measure(route, method, build, dataset, repeat) for route, method, build in SCENARIOS}
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_budgets(results, budgets, metrics=('queries', 'ms', 'bytes')):
+    '''
+    Budget violations of one scale's results, as readable messages
+    '''
+    violations = []
+    for route, result in results.items():
+        if not 200 <= result['status'] < 300:
+            violations.append(f'{route}: status {result["status"]}')
+        budget = budgets.get(route)
+        if budget is None:
+            violations.append(f'{route}: no budget in {BUDGETS_PATH.name}')
+            continue
+        for metric in metrics:
+            if metric in budget and result[metric] > budget[metric]:
+                violations.append(f'{route}: {metric} {result[metric]} over budget {budget[metric]}')
+    return violations
@@ -0,0 +1,19 @@
+from django.test import TestCase
+
+from .suite import SCENARIOS, run_suite, load_budgets, check_budgets
+
+
+class BenchmarkBudgetTest(TestCase):
+    def test_every_api_route_has_a_scenario(self):
+        from api.v1.accounts.urls import urlpatterns as account_urls
+        from api.v1.courses.urls import urlpatterns as course_urls
+
+        routes = {pattern.name for pattern in account_urls + course_urls}
+
+        self.assertEqual(routes - {route for route, _, _ in SCENARIOS}, set())
+
+    def test_query_budgets(self):
+        # Timings are left to `manage.py benchmark`, they are too noisy here
+        results = run_suite('small', repeat=1)
+
+        self.assertEqual(check_budgets(results, load_budgets(), metrics=('queries', 'bytes')), [])
@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+class AsyncRoutesHandler(type(django_application)):
+    '''
+    Route requests through core.urls_asgi, where the read-heavy course
+    endpoints are async views. WSGI keeps using core.urls.
+    '''
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = 'core.urls_asgi'
+        return request, error_response
+
+
+application = AsyncRoutesHandler()
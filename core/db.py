@@ -0,0 +1,134 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+from django.db import connections
+
+
+REPLICA = 'replica'
+
+# Set while a view that tolerates replication lag is reading
+use_replica = ContextVar('use_replica', default=False)
+
+
+def env_bool(env, name, default=False):
+    return env.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def sqlite_database(name, env):
+    '''
+    SQLite tuned for concurrent writers: WAL lets readers run alongside the
+    writer, IMMEDIATE transactions take the write lock up front so
+    busy_timeout can wait for it instead of failing with "database is locked"
+    '''
+    pragmas = [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA busy_timeout={int(env.get("SQLITE_BUSY_TIMEOUT", 5000))}',
+        f'PRAGMA mmap_size={int(env.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))}',
+        # Negative sizes are in KiB
+        f'PRAGMA cache_size=-{int(env.get("SQLITE_CACHE_SIZE", 64 * 1024))}',
+        'PRAGMA temp_store=MEMORY',
+    ]
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'OPTIONS': {
+            'init_command': '; '.join(pragmas),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': int(env.get('SQLITE_BUSY_TIMEOUT', 5000)) / 1000,
+        },
+        # A file rather than the in-memory default, whose shared cache fails
+        # on a lock at once instead of waiting for busy_timeout
+        'TEST': {'NAME': Path(name).with_name(f'test_{Path(name).name}')},
+    }
+
+
+def postgresql_database(host, env):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('DB_NAME', 'elearning'),
+        'USER': env.get('DB_USER', ''),
+        'PASSWORD': env.get('DB_PASSWORD', ''),
+        'HOST': host,
+        'PORT': env.get('DB_PORT', ''),
+        'CONN_MAX_AGE': int(env.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if env_bool(env, 'DB_POOL'):
+        # The psycopg pool replaces persistent connections, Django refuses both
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {
+            'min_size': int(env.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(env.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(env.get('DB_POOL_TIMEOUT', 10)),
+        }
+    return database
+
+
+def database_settings(base_dir, env):
+    '''
+    DATABASES from the environment. DB_ENGINE is ``sqlite`` (default) or
+    ``postgresql``; DB_REPLICA_NAME (SQLite file) or DB_REPLICA_HOST
+    (PostgreSQL) adds a ``replica`` alias for ReplicaRouter.
+    '''
+    engine = env.get('DB_ENGINE', 'sqlite')
+    if engine == 'sqlite':
+        databases = {'default': sqlite_database(env.get('DB_NAME', base_dir / 'db.sqlite3'), env)}
+        if env.get('DB_REPLICA_NAME'):
+            databases[REPLICA] = sqlite_database(env['DB_REPLICA_NAME'], env)
+    elif engine == 'postgresql':
+        databases = {'default': postgresql_database(env.get('DB_HOST', 'localhost'), env)}
+        if env.get('DB_REPLICA_HOST'):
+            databases[REPLICA] = postgresql_database(env['DB_REPLICA_HOST'], env)
+    else:
+        raise ValueError(f'Unsupported DB_ENGINE {engine!r}')
+
+    if REPLICA in databases:
+        # Tests read the replica through the default test database
+        databases[REPLICA]['TEST'] = {'MIRROR': 'default'}
+    return databases
+
+
+class ReplicaRouter:
+    '''
+    Send reads to the replica while ``use_replica`` is set, everything else
+    to the default database
+    '''
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and REPLICA in connections.settings:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+@contextmanager
+def replica_reads():
+    token = use_replica.set(True)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+def reads_from_replica(view):
+    '''
+    Run a GET handler's reads against the replica
+    '''
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return view(self, request, *args, **kwargs)
+        with replica_reads():
+            return view(self, request, *args, **kwargs)
+    return wrapper
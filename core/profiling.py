@@ -0,0 +1,168 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# Profile of the request being handled, None when it was not sampled
+current_profile = ContextVar('current_profile', default=None)
+
+# Most recent requests slower than PROFILING_SLOW_MS
+slow_requests = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+def fingerprint(sql):
+    '''
+    SQL with IN lists collapsed, so the same query for another row matches
+    '''
+    return PLACEHOLDER_LIST.sub('%s, ...', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.queries = Counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries[fingerprint(sql)] += 1
+
+    def summary(self, request, response):
+        total = time.perf_counter() - self.started
+        match = request.resolver_match
+        return {
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(self.db_time * 1000, 2),
+            'serializer_ms': round(self.serializer_time * 1000, 2),
+            'queries': sum(self.queries.values()),
+            'duplicates': [
+                {'sql': sql, 'count': count}
+                for sql, count in self.queries.most_common(5)
+                if count > 1
+            ],
+        }
+
+
+def server_timing(summary):
+    return ', '.join([
+        f'total;dur={summary["total_ms"]}',
+        f'db;dur={summary["db_ms"]};desc="{summary["queries"]} queries"',
+        f'serializer;dur={summary["serializer_ms"]}',
+    ])
+
+
+def record_current_query(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.record_query(execute, sql, params, many, context)
+
+
+def watch_connections():
+    '''
+    Install record_current_query on this thread's connections, queries are
+    recorded whenever a profile is current
+    '''
+    for connection in connections.all():
+        if record_current_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_current_query)
+
+
+@contextmanager
+def profiling(profile):
+    token = current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        current_profile.reset(token)
+
+
+class ProfilingMiddleware:
+    '''
+    Record query count, DB time, repeated SQL and serializer time for a sample
+    of requests, answer them with a Server-Timing header and log them
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        watch_connections()
+        with profiling(profile):
+            response = self.get_response(request)
+        return self.finish(profile, request, response)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        # The ORM runs on the thread sync_to_async uses, with its own connections
+        await sync_to_async(watch_connections)()
+        with profiling(profile):
+            response = await self.get_response(request)
+        return self.finish(profile, request, response)
+
+    def finish(self, profile, request, response):
+        summary = profile.summary(request, response)
+        response['Server-Timing'] = server_timing(summary)
+        if summary['total_ms'] >= settings.PROFILING_SLOW_MS:
+            logger.warning(json.dumps(summary))
+            slow_requests.append(summary)
+        else:
+            logger.info(json.dumps(summary))
+        return response
+
+
+class ProfiledSerializerMixin:
+    '''
+    Add the time spent serializing to the request profile. Nested
+    serializers are part of their parent's time.
+    '''
+    def to_representation(self, instance):
+        profile = current_profile.get()
+        if profile is None or profile.serializer_depth:
+            return super().to_representation(instance)
+
+        profile.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            profile.serializer_time += time.perf_counter() - start
+            profile.serializer_depth -= 1
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from core.db import database_settings, env_bool
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,12 +47,15 @@ INSTALLED_APPS = [
     # local apps
     'accounts',
     'courses',
+    'jobs',
+    'benchmarks',
 ]
 
 # Custom user model
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,11 +89,78 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+DATABASES = database_settings(BASE_DIR, os.environ)
+
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# Local memory is per process, set REDIS_URL in production so that every
+# worker sees the same course cache versions
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cache used for serialized course and lesson payloads
+COURSE_CACHE_ALIAS = os.environ.get('COURSE_CACHE_ALIAS', 'default')
+COURSE_CACHE_TIMEOUT = int(os.environ.get('COURSE_CACHE_TIMEOUT', 60 * 60))
+
+# Per-user sets of enrolled course ids
+ENROLLMENT_CACHE_TIMEOUT = int(os.environ.get('ENROLLMENT_CACHE_TIMEOUT', 60 * 60))
+
+
+# Background jobs, run with `manage.py runworker`
+JOBS_MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled on every further attempt
+JOBS_RETRY_BACKOFF = 2
+JOBS_RETRY_BACKOFF_MAX = 60 * 10
+# Seconds after which a job still marked running is considered abandoned
+JOBS_STALE_AFTER = 60 * 15
+
+
+# Course analytics rollups, built by `manage.py rollup_analytics`
+# Seconds a row must be old before it is rolled up, so transactions still
+# open when a run starts cannot commit rows behind the watermark
+ANALYTICS_ROLLUP_LAG = 60 * 5
+
+
+# Request profiling, see core/profiling.py
+# Share of requests that are measured, keep it low in production
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 1.0 if DEBUG else 0.01))
+# Requests at least this slow are kept for /api/v1/profiling/slow-requests/
+PROFILING_SLOW_MS = int(os.environ.get('PROFILING_SLOW_MS', 200))
+PROFILING_BUFFER_SIZE = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # One JSON line per profiled request, slow ones as warnings
+        'core.profiling': {
+            'handlers': ['console'],
+            'level': os.environ.get('PROFILING_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -132,6 +205,14 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Authentication
+AUTHENTICATION_BACKENDS = ['accounts.auth.CachedModelBackend']
+
+# Authenticated users are cached with their balance and subscription ids
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 60))
+
+AUTH_BASIC_ENABLED = env_bool(os.environ, 'AUTH_BASIC_ENABLED', DEBUG)
+
 # Rest Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -139,7 +220,9 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'accounts.auth.CachedJWTAuthentication',
+        # Hashes the password on every request, for local use
+        *(['rest_framework.authentication.BasicAuthentication'] if AUTH_BASIC_ENABLED else []),
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
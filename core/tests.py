@@ -0,0 +1,105 @@
+from pathlib import Path
+from unittest import mock
+
+from django.db import connection, connections
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+
+from accounts.models import CustomUser
+from courses.models import Course
+from .db import REPLICA, ReplicaRouter, database_settings, replica_reads, use_replica
+
+
+BASE_DIR = Path('/srv/app')
+
+
+class DatabaseSettingsTest(SimpleTestCase):
+    def test_sqlite_pragmas(self):
+        databases = database_settings(BASE_DIR, {'SQLITE_BUSY_TIMEOUT': '2000'})
+
+        default = databases['default']
+        self.assertEqual(default['NAME'], BASE_DIR / 'db.sqlite3')
+        self.assertEqual(default['TEST']['NAME'], BASE_DIR / 'test_db.sqlite3')
+        self.assertEqual(default['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(default['OPTIONS']['timeout'], 2)
+        init_command = default['OPTIONS']['init_command']
+        for pragma in ('journal_mode=WAL', 'synchronous=NORMAL', 'busy_timeout=2000', 'mmap_size=', 'cache_size=-'):
+            self.assertIn(f'PRAGMA {pragma}', init_command)
+        self.assertNotIn(REPLICA, databases)
+
+    def test_sqlite_replica_file(self):
+        databases = database_settings(BASE_DIR, {'DB_NAME': 'primary.sqlite3', 'DB_REPLICA_NAME': 'replica.sqlite3'})
+
+        self.assertEqual(databases['default']['NAME'], 'primary.sqlite3')
+        self.assertEqual(databases[REPLICA]['NAME'], 'replica.sqlite3')
+        self.assertEqual(databases[REPLICA]['TEST'], {'MIRROR': 'default'})
+
+    def test_postgresql_persistent_connections(self):
+        databases = database_settings(BASE_DIR, {'DB_ENGINE': 'postgresql', 'DB_HOST': 'db', 'DB_CONN_MAX_AGE': '300'})
+
+        default = databases['default']
+        self.assertEqual(default['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(default['HOST'], 'db')
+        self.assertEqual(default['CONN_MAX_AGE'], 300)
+        self.assertTrue(default['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', default['OPTIONS'])
+
+    def test_postgresql_pool_disables_persistent_connections(self):
+        databases = database_settings(BASE_DIR, {
+            'DB_ENGINE': 'postgresql', 'DB_POOL': 'true', 'DB_POOL_MAX_SIZE': '20', 'DB_REPLICA_HOST': 'replica',
+        })
+
+        for alias in ('default', REPLICA):
+            self.assertEqual(databases[alias]['CONN_MAX_AGE'], 0)
+            self.assertEqual(databases[alias]['OPTIONS']['pool']['max_size'], 20)
+        self.assertEqual(databases[REPLICA]['HOST'], 'replica')
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            database_settings(BASE_DIR, {'DB_ENGINE': 'oracle'})
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def test_reads_stay_on_default_without_replica(self):
+        databases = {alias: config for alias, config in connections.settings.items() if alias != REPLICA}
+        with mock.patch.dict(connections.settings, databases, clear=True), replica_reads():
+            self.assertIsNone(self.router.db_for_read(Course))
+
+    def test_replica_reads(self):
+        with mock.patch.dict(connections.settings, {REPLICA: connections.settings['default']}):
+            self.assertIsNone(self.router.db_for_read(Course))
+            with replica_reads():
+                self.assertEqual(self.router.db_for_read(Course), REPLICA)
+                self.assertEqual(self.router.db_for_write(Course), 'default')
+
+    def test_replica_is_not_migrated(self):
+        self.assertTrue(self.router.allow_migrate('default', 'courses'))
+        self.assertFalse(self.router.allow_migrate(REPLICA, 'courses'))
+
+
+class ReplicaViewTest(APITestCase):
+    def setUp(self):
+        author = CustomUser.objects.create_user(username='author', email='author@example.com')
+        Course.objects.create(title='Course', author=author, price=10)
+        self.client.force_authenticate(author)
+
+    def replica_flags(self, method, url, data=None):
+        flags = []
+
+        def record(execute, sql, params, many, context):
+            flags.append(use_replica.get())
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            getattr(self.client, method)(url, data)
+        return flags
+
+    def test_course_list_reads_from_replica(self):
+        self.assertTrue(all(self.replica_flags('get', reverse('course-list'))))
+
+    def test_course_create_uses_default(self):
+        self.assertFalse(any(self.replica_flags('post', reverse('course-list'), {'title': 'New', 'price': 5})))
@@ -25,6 +25,7 @@ v1_api_urlpatterns = [
     
     path('accounts/', include('api.v1.accounts.urls')),
     path('courses/', include('api.v1.courses.urls')),
+    path('profiling/', include('api.v1.profiling.urls')),
     
     # Specular API endpoints
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
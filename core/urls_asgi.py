@@ -0,0 +1,13 @@
+"""
+URL configuration used by core.asgi: the read-heavy course endpoints are
+served by async views, everything else is core.urls.
+"""
+from django.urls import path, include
+
+from .urls import urlpatterns as sync_urlpatterns
+
+
+urlpatterns = [
+    path('api/v1/courses/', include('api.v1.courses.async_urls')),
+    *sync_urlpatterns,
+]
@@ -1,39 +1,116 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 
 from .models import Course, Lesson, Group, Subscription, CompletedLesson, SubscriptionCourse
 
 
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    '''
+    Related filter choosing its row with the admin autocomplete widget, so
+    the related table is searched instead of listed. The related admin
+    needs search_fields.
+    '''
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.admin_site = model_admin.admin_site
+
+    def field_choices(self, field, request, model_admin):
+        return []
+
+    def has_output(self):
+        return True
+
+    def widget(self):
+        choices = forms.ModelChoiceField(
+            queryset=self.field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(self.field, self.admin_site, attrs={'style': 'width: 100%'}),
+            required=False,
+        )
+        return choices.widget.render(self.lookup_kwarg, self.lookup_val, attrs={'id': f'{self.lookup_kwarg}_filter'})
+
+
+class AutocompleteFilterAdmin(admin.ModelAdmin):
+    @property
+    def media(self):
+        filter_media = forms.Media(js=['admin/js/jquery.init.js', 'courses/admin/autocomplete_filter.js'])
+        return super().media + AutocompleteSelect(None, self.admin_site).media + filter_media
+
+
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
-    list_display = ['title', 'author', 'price', 'created_at', 'updated_at']
-    list_filter = ['author', 'created_at', 'updated_at'  ]
-    search_fields = ['title', 'author', 'created_at', 'updated_at'  ]
+class CourseAdmin(AutocompleteFilterAdmin):
+    list_display = ['title', 'author', 'price', 'lessons_count', 'students_count', 'created_at', 'updated_at']
+    list_filter = [('author', AutocompleteFilter), 'created_at', 'updated_at']
+    list_select_related = ['author']
+    show_full_result_count = False
+    ordering = ['-created_at', '-id']
+    search_fields = ['title', 'author__username']
+    autocomplete_fields = ['author']
+
+    def get_queryset(self, request):
+        # Autocomplete results are labelled with __str__, which reads the author
+        return super().get_queryset(request).select_related('author')
 
 
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
-    list_display = ['title', 'course', 'created_at', 'updated_at' ]
-    list_filter = ['course', 'created_at', 'updated_at'  ]
+class LessonAdmin(AutocompleteFilterAdmin):
+    list_display = ['title', 'course', 'created_at', 'updated_at']
+    list_filter = [('course', AutocompleteFilter), 'created_at', 'updated_at']
+    list_select_related = ['course__author']
+    show_full_result_count = False
     search_fields = ['title']
+    autocomplete_fields = ['course']
+
+    def get_queryset(self, request):
+        # Autocomplete results are labelled with __str__, which reads the course
+        return super().get_queryset(request).select_related('course__author')
+
+    def get_readonly_fields(self, request, obj=None):
+        # A lesson moved to another course would keep its position there and
+        # leave the lessons_count of both courses wrong
+        if obj is not None:
+            return [*super().get_readonly_fields(request, obj), 'course']
+        return super().get_readonly_fields(request, obj)
 
 
 @admin.register(Group)
-class GroupAdmin(admin.ModelAdmin):
-    list_display = ['name', 'course', 'created_at', 'updated_at']
-    list_filter = ['course', 'created_at', 'updated_at']
-    search_fields = ['name', 'course', 'created_at', 'updated_at' ]
-    
+class GroupAdmin(AutocompleteFilterAdmin):
+    list_display = ['name', 'course', 'members_count', 'created_at', 'updated_at']
+    list_filter = [('course', AutocompleteFilter), 'created_at', 'updated_at']
+    list_select_related = ['course__author']
+    show_full_result_count = False
+    search_fields = ['name', 'course__title']
+    autocomplete_fields = ['course', 'members']
+
 
 @admin.register(CompletedLesson)
-class CompletedLessonAdmin(admin.ModelAdmin):
-    list_display = ['lesson', 'completed_at', 'score']
-    list_filter = ['lesson', 'completed_at','score']
+class CompletedLessonAdmin(AutocompleteFilterAdmin):
+    list_display = ['lesson', 'subscription_course', 'completed_at', 'score']
+    list_filter = [('lesson', AutocompleteFilter), 'completed_at']
+    list_select_related = ['lesson__course__author', 'subscription_course']
+    show_full_result_count = False
+    raw_id_fields = ['subscription_course']
+    autocomplete_fields = ['lesson']
 
 
 @admin.register(SubscriptionCourse)
-class SubscriptionCourseAdmin(admin.ModelAdmin):
-    list_display = ['started_at', 'ended_at', 'completed_percentage']
-    list_filter = ['started_at', 'ended_at', 'completed_percentage']
-    
+class SubscriptionCourseAdmin(AutocompleteFilterAdmin):
+    list_display = [
+        'id', 'subscription', 'course', 'started_at', 'ended_at', 'completed_lessons_count', 'completed_percentage',
+    ]
+    list_filter = [('course', AutocompleteFilter), 'started_at', 'ended_at']
+    list_select_related = ['subscription', 'course__author']
+    show_full_result_count = False
+    raw_id_fields = ['subscription']
+    autocomplete_fields = ['course']
+
 
-admin.site.register(Subscription)
+@admin.register(Subscription)
+class SubscriptionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user']
+    list_select_related = ['user']
+    show_full_result_count = False
+    search_fields = ['user__username', 'user__email']
+    autocomplete_fields = ['user']
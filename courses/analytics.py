@@ -0,0 +1,170 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AnalyticsWatermark, CompletedLesson, CourseDailyStats, Lesson, LessonStats, SubscriptionCourse
+
+
+WATERMARK = 'course-rollups'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+DAILY_FIELDS = ['enrollments', 'completions', 'lesson_completions', 'score_sum']
+LESSON_FIELDS = ['completions', 'score_sum']
+
+
+def per_day(queryset, date_field, course_field, start, end, **aggregates):
+    return (
+        queryset.filter(**{f'{date_field}__gt': start, f'{date_field}__lte': end})
+        .annotate(day=TruncDate(date_field))
+        .order_by()
+        .values(course_field, 'day')
+        .annotate(**aggregates)
+    )
+
+
+def daily_deltas(start, end):
+    deltas = defaultdict(Counter)
+    for row in per_day(SubscriptionCourse.objects, 'started_at', 'course_id', start, end, count=Count('pk')):
+        deltas[row['course_id'], row['day']]['enrollments'] += row['count']
+    for row in per_day(SubscriptionCourse.objects, 'ended_at', 'course_id', start, end, count=Count('pk')):
+        deltas[row['course_id'], row['day']]['completions'] += row['count']
+    for row in per_day(
+        CompletedLesson.objects, 'completed_at', 'subscription_course__course_id', start, end,
+        count=Count('pk'), score=Sum('score'),
+    ):
+        delta = deltas[row['subscription_course__course_id'], row['day']]
+        delta['lesson_completions'] += row['count']
+        delta['score_sum'] += row['score']
+    return deltas
+
+
+def lesson_deltas(start, end):
+    rows = (
+        CompletedLesson.objects.filter(completed_at__gt=start, completed_at__lte=end)
+        .order_by()
+        .values('lesson_id')
+        .annotate(count=Count('pk'), score=Sum('score'))
+    )
+    return {row['lesson_id']: Counter(completions=row['count'], score_sum=row['score']) for row in rows}
+
+
+def merge_daily(deltas):
+    existing = {
+        (stats.course_id, stats.date): stats
+        for stats in CourseDailyStats.objects.filter(
+            course_id__in={course_id for course_id, _ in deltas},
+            date__in={day for _, day in deltas},
+        )
+    }
+    rows = []
+    for (course_id, day), delta in deltas.items():
+        # New instances, the upsert conflicts on (course, date) and not on id
+        current = existing.get((course_id, day))
+        rows.append(CourseDailyStats(
+            course_id=course_id,
+            date=day,
+            **{field: delta[field] + (getattr(current, field) if current else 0) for field in DAILY_FIELDS},
+        ))
+    CourseDailyStats.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['course', 'date'], update_fields=DAILY_FIELDS,
+    )
+
+
+def merge_lessons(deltas):
+    existing = LessonStats.objects.in_bulk(deltas)
+    rows = []
+    for lesson_id, delta in deltas.items():
+        current = existing.get(lesson_id)
+        rows.append(LessonStats(
+            lesson_id=lesson_id,
+            **{field: delta[field] + (getattr(current, field) if current else 0) for field in LESSON_FIELDS},
+        ))
+    LessonStats.objects.bulk_create(rows, update_conflicts=True, unique_fields=['lesson'], update_fields=LESSON_FIELDS)
+
+
+def rollup(until=None):
+    '''
+    Add the enrollments, finished courses and lesson completions recorded
+    since the watermark to the rollups, then move the watermark to
+    ``until``. Returns the ``(start, until)`` window, None when there was
+    nothing to do.
+    '''
+    if until is None:
+        until = timezone.now() - timedelta(seconds=settings.ANALYTICS_ROLLUP_LAG)
+    with transaction.atomic():
+        # The lock keeps two runs from counting the same window twice
+        watermark, _ = AnalyticsWatermark.objects.select_for_update().get_or_create(
+            name=WATERMARK, defaults={'processed_until': EPOCH},
+        )
+        start = watermark.processed_until
+        if until <= start:
+            return None
+
+        merge_daily(daily_deltas(start, until))
+        merge_lessons(lesson_deltas(start, until))
+        watermark.processed_until = until
+        watermark.save(update_fields=['processed_until'])
+    return start, until
+
+
+def percentage(part, whole):
+    return round(100 * part / whole, 2) if whole else None
+
+
+def average(total, count):
+    return round(total / count, 2) if count else None
+
+
+def course_analytics(course, since=None, until=None):
+    '''
+    Statistics of a course read from the rollups, optionally limited to the
+    days from ``since`` to ``until``. Totals and lessons cover all time.
+    '''
+    all_days = CourseDailyStats.objects.filter(course=course)
+    totals = all_days.aggregate(**{field: Sum(field, default=0) for field in DAILY_FIELDS})
+    days = all_days
+    if since is not None:
+        days = days.filter(date__gte=since)
+    if until is not None:
+        days = days.filter(date__lte=until)
+    lessons = (
+        Lesson.objects.filter(course=course)
+        .order_by('position', 'id')
+        .values('id', 'title', 'stats__completions', 'stats__score_sum')
+    )
+
+    return {
+        'enrollments': totals['enrollments'],
+        'completions': totals['completions'],
+        'completion_rate': percentage(totals['completions'], totals['enrollments']),
+        'average_score': average(totals['score_sum'], totals['lesson_completions']),
+        'updated_until': (
+            AnalyticsWatermark.objects.filter(name=WATERMARK).values_list('processed_until', flat=True).first()
+        ),
+        'daily': [
+            {
+                'date': stats.date,
+                'enrollments': stats.enrollments,
+                'completions': stats.completions,
+                'lesson_completions': stats.lesson_completions,
+                'average_score': average(stats.score_sum, stats.lesson_completions),
+            }
+            for stats in days
+        ],
+        # Share of all enrolled students who completed each lesson, in course order
+        'lessons': [
+            {
+                'id': lesson['id'],
+                'title': lesson['title'],
+                'completions': lesson['stats__completions'] or 0,
+                'completion_rate': percentage(lesson['stats__completions'] or 0, totals['enrollments']),
+                'average_score': average(lesson['stats__score_sum'] or 0, lesson['stats__completions'] or 0),
+            }
+            for lesson in lessons
+        ],
+    }
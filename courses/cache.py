@@ -0,0 +1,112 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from rest_framework.response import Response
+
+
+def get_course_cache():
+    return caches[settings.COURSE_CACHE_ALIAS]
+
+
+def version_key(course_id):
+    return f'course:{course_id}:version'
+
+
+def get_course_version(course_id):
+    '''
+    Current cache version of a course, created on first use
+    '''
+    cache = get_course_cache()
+    key = version_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock, so a version key that expired or was evicted
+        # never comes back with a number whose entries may still be cached
+        version = time.time_ns()
+        if not cache.add(key, version, settings.COURSE_CACHE_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+async def aget_course_version(course_id):
+    cache = get_course_cache()
+    key = version_key(course_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, settings.COURSE_CACHE_TIMEOUT):
+            version = await cache.aget(key, version)
+    return version
+
+
+def bump_course_version(course_id):
+    '''
+    Invalidate every cached payload of a course
+    '''
+    try:
+        get_course_cache().incr(version_key(course_id))
+    except ValueError:
+        get_course_version(course_id)
+
+
+def bump_course_version_on_commit(course_id):
+    transaction.on_commit(lambda: bump_course_version(course_id))
+
+
+def payload_key(request, course_id, version, name):
+    variant = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'course:{course_id}:{version}:{name}:{variant}', variant
+
+
+def cache_entry(data, last_modified):
+    return {'data': data, 'last_modified': int(last_modified.timestamp())}
+
+
+def conditional_response(request, course_id, version, variant, entry):
+    etag = quote_etag(f'{course_id}-{version}-{variant[:16]}')
+    # Only the ETag decides a 304: enrollments change the payload without
+    # touching updated_at, and Last-Modified only has second resolution
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = Response(entry['data'])
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    return response
+
+
+def cached_course_response(request, course_id, name, build):
+    '''
+    Response for the payload ``build()`` returns as ``(data, last_modified)``,
+    cached per course version and answering If-None-Match with 304
+    '''
+    cache = get_course_cache()
+    version = get_course_version(course_id)
+    key, variant = payload_key(request, course_id, version, name)
+
+    entry = cache.get(key)
+    if entry is None:
+        entry = cache_entry(*build())
+        cache.set(key, entry, settings.COURSE_CACHE_TIMEOUT)
+    return conditional_response(request, course_id, version, variant, entry)
+
+
+async def acached_course_response(request, course_id, name, abuild):
+    '''
+    cached_course_response() for async views, ``abuild`` is a coroutine
+    function. Both share the cached entries.
+    '''
+    cache = get_course_cache()
+    version = await aget_course_version(course_id)
+    key, variant = payload_key(request, course_id, version, name)
+
+    entry = await cache.aget(key)
+    if entry is None:
+        entry = cache_entry(*await abuild())
+        await cache.aset(key, entry, settings.COURSE_CACHE_TIMEOUT)
+    return conditional_response(request, course_id, version, variant, entry)
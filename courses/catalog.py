@@ -0,0 +1,184 @@
+import codecs
+import json
+import shutil
+import tempfile
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import POSITION_GAP, Course, Lesson
+from .search import index_courses
+
+
+JSON = 'json'
+NDJSON = 'ndjson'
+FORMATS = (JSON, NDJSON)
+
+CHUNK_SIZE = 64 * 1024
+
+# Where read_json_array() is in the array
+START, FIRST, NEXT, ITEM = range(4)
+
+
+class CatalogError(Exception):
+    pass
+
+
+def read_json_array(stream, chunk_size=CHUNK_SIZE):
+    '''
+    Yield the items of the JSON array in the binary ``stream`` as they are
+    read, the document is never loaded whole
+    '''
+    decoder = json.JSONDecoder(parse_float=Decimal)
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer, eof, state = '', False, START
+
+    def read():
+        chunk = stream.read(chunk_size)
+        return text.decode(chunk, final=not chunk), not chunk
+
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer:
+            if eof:
+                raise CatalogError('The catalog ends before its closing bracket')
+            buffer, eof = read()
+        elif state == START:
+            if buffer[0] != '[':
+                raise CatalogError('The catalog must be a JSON array of courses')
+            buffer, state = buffer[1:], FIRST
+        elif buffer[0] == ']' and state in (FIRST, NEXT):
+            return
+        elif state == NEXT:
+            if buffer[0] != ',':
+                raise CatalogError('Courses must be separated by commas')
+            buffer, state = buffer[1:], ITEM
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # Most likely cut by the chunk, unless there is nothing left
+                if eof:
+                    raise CatalogError('The catalog is not valid JSON')
+                more, eof = read()
+                buffer += more
+                continue
+            yield item
+            buffer, state = buffer[end:], NEXT
+
+
+def read_ndjson(stream):
+    '''
+    Yield one item per non-empty line of the binary ``stream``
+    '''
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line, parse_float=Decimal)
+        except ValueError:
+            raise CatalogError(f'Line {number} is not valid JSON')
+
+
+def spool(stream):
+    '''
+    Copy the binary ``stream`` to a temporary file, on disk past
+    FILE_UPLOAD_MAX_MEMORY_SIZE, and return it rewound. Reading a slow
+    upload inside import_catalog() would keep SQLite's write lock for as
+    long as the upload takes.
+    '''
+    spooled = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    shutil.copyfileobj(stream, spooled, CHUNK_SIZE)
+    spooled.seek(0)
+    return spooled
+
+
+def read_catalog(stream, format):
+    return read_ndjson(stream) if format == NDJSON else read_json_array(stream)
+
+
+def validation_message(error):
+    return '; '.join(f'{field}: {" ".join(messages)}' for field, messages in error.message_dict.items())
+
+
+def clean_course(item, number, author):
+    '''
+    Unsaved course and lessons for one catalog item, validated like the models
+    '''
+    if not isinstance(item, dict) or not isinstance(item.get('lessons', []), list):
+        raise CatalogError(f'Course {number} must be an object with a list of lessons')
+
+    lessons = item.get('lessons', [])
+    course = Course(author=author, title=item.get('title'), price=item.get('price'), lessons_count=len(lessons))
+    try:
+        course.clean_fields(exclude=['author'])
+    except ValidationError as e:
+        raise CatalogError(f'Course {number}: {validation_message(e)}')
+
+    cleaned = []
+    for position, lesson in enumerate(lessons, 1):
+        if not isinstance(lesson, dict):
+            raise CatalogError(f'Course {number}, lesson {position} must be an object')
+        lesson = Lesson(
+            title=lesson.get('title'), video_url=lesson.get('video_url'), position=position * POSITION_GAP,
+        )
+        try:
+            lesson.clean_fields(exclude=['course'])
+        except ValidationError as e:
+            raise CatalogError(f'Course {number}, lesson {position}: {validation_message(e)}')
+        cleaned.append(lesson)
+    return course, cleaned
+
+
+def import_catalog(items, author, batch_size=500):
+    '''
+    Create the courses and lessons of the catalog ``items`` for ``author``,
+    ``batch_size`` courses per bulk insert, all in one transaction. No
+    post_save handler runs, lesson counters are set from the catalog and the
+    courses are indexed once at the end. Returns how many courses and
+    lessons were created.
+    '''
+    course_ids, lessons_created = [], 0
+    numbered = enumerate(items, 1)
+
+    with transaction.atomic():
+        while batch := [clean_course(item, number, author) for number, item in islice(numbered, batch_size)]:
+            courses = Course.objects.bulk_create([course for course, _ in batch])
+            lessons = []
+            for course, course_lessons in batch:
+                for lesson in course_lessons:
+                    lesson.course = course
+                    lessons.append(lesson)
+            Lesson.objects.bulk_create(lessons, batch_size=batch_size)
+            course_ids.extend(course.pk for course in courses)
+            lessons_created += len(lessons)
+
+        for start in range(0, len(course_ids), batch_size):
+            index_courses(course_ids[start:start + batch_size])
+
+    return len(course_ids), lessons_created
+
+
+def clone_course(course, author, title=None):
+    '''
+    Copy ``course`` and its lessons for ``author``. The lessons are copied
+    by one INSERT ... SELECT, none of them is read.
+    '''
+    table = Lesson._meta.db_table
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    with transaction.atomic():
+        clone = Course.objects.create(title=title or course.title, author=author, price=course.price)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (title, course_id, video_url, position, created_at, updated_at) '
+                f'SELECT title, %s, video_url, position, %s, %s FROM {table} WHERE course_id = %s ORDER BY position, id',
+                [clone.pk, now, now, course.pk],
+            )
+            clone.lessons_count = cursor.rowcount
+        Course.objects.filter(pk=clone.pk).update(lessons_count=clone.lessons_count)
+    return clone
@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import SubscriptionCourse, CompletedLesson
+
+
+CHUNK_SIZE = 2000
+
+class Export(NamedTuple):
+    model: type
+    course_field: str
+    # Filtered by the since/until range
+    date_field: str
+    # Matches an index, so rows stream without a sort
+    ordering: tuple
+    # Column name to values_list() lookup
+    columns: dict
+
+
+EXPORTS = {
+    'enrollments': Export(
+        SubscriptionCourse, 'course_id', 'started_at', ('pk',), {
+            'user_id': 'subscription__user_id',
+            'username': 'subscription__user__username',
+            'email': 'subscription__user__email',
+            'started_at': 'started_at',
+            'ended_at': 'ended_at',
+            'completed_lessons': 'completed_lessons_count',
+            'completed_percentage': 'completed_percentage',
+        },
+    ),
+    'completions': Export(
+        CompletedLesson, 'subscription_course__course_id', 'completed_at', ('subscription_course', 'lesson'), {
+            'user_id': 'subscription_course__subscription__user_id',
+            'username': 'subscription_course__subscription__user__username',
+            'lesson_id': 'lesson_id',
+            'lesson_title': 'lesson__title',
+            'completed_at': 'completed_at',
+            'client_completed_at': 'client_completed_at',
+            'score': 'score',
+        },
+    ),
+}
+
+
+def export_rows(name, course_id, since=None, until=None):
+    '''
+    Header and a lazy iterator of value tuples for one export of a course,
+    read in chunks without building model instances
+    '''
+    export = EXPORTS[name]
+    queryset = export.model.objects.filter(**{export.course_field: course_id})
+    if since is not None:
+        queryset = queryset.filter(**{f'{export.date_field}__gte': since})
+    if until is not None:
+        queryset = queryset.filter(**{f'{export.date_field}__lt': until})
+    rows = queryset.order_by(*export.ordering).values_list(*export.columns.values()).iterator(chunk_size=CHUNK_SIZE)
+    return list(export.columns), rows
+
+
+def chunked(lines, size=CHUNK_SIZE):
+    # One write per chunk of rows instead of one per row
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_lines(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield line(header)
+    for values in rows:
+        yield line([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+
+
+def ndjson_lines(header, rows):
+    for values in rows:
+        yield json.dumps(dict(zip(header, values)), cls=DjangoJSONEncoder) + '\n'
+
+
+FORMATS = {
+    'csv': ('text/csv', csv_lines),
+    'ndjson': ('application/x-ndjson', ndjson_lines),
+}
+
+
+async def aiter_chunks(chunks):
+    '''
+    ``chunks`` as an async iterator. ASGI reads a sync iterator whole before
+    sending any of it, this one is read chunk by chunk on the thread the
+    view ran on, which holds the database cursor.
+    '''
+    read = sync_to_async(next)
+    try:
+        while (chunk := await read(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+def stream_export(output, header, rows, asynchronous=False):
+    '''
+    Content type and the chunks of an export written as ``output``, an
+    async iterator of them for ASGI servers when ``asynchronous``
+    '''
+    content_type, lines = FORMATS[output]
+    chunks = chunked(lines(header, rows))
+    return content_type, aiter_chunks(chunks) if asynchronous else chunks
@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from courses.catalog import FORMATS, JSON, NDJSON, CatalogError, import_catalog, read_catalog, spool
+
+
+class Command(BaseCommand):
+    help = 'Create courses and their lessons from a JSON array or NDJSON catalog, all or nothing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file, - for stdin')
+        parser.add_argument('--author', required=True, help='Email of the author of the imported courses')
+        parser.add_argument(
+            '--format', choices=FORMATS, help='Catalog format, NDJSON for .ndjson and .jsonl files, JSON otherwise',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Courses created per bulk insert')
+
+    def handle(self, *args, path, author, format, batch_size, **options):
+        try:
+            author = CustomUser.objects.get(email=author)
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'No user with the email {author}')
+
+        if format is None:
+            format = NDJSON if Path(path).suffix in ('.ndjson', '.jsonl') else JSON
+        try:
+            if path == '-':
+                with spool(sys.stdin.buffer) as stream:
+                    courses, lessons = import_catalog(read_catalog(stream, format), author, batch_size)
+            else:
+                with open(path, 'rb') as stream:
+                    courses, lessons = import_catalog(read_catalog(stream, format), author, batch_size)
+        except (CatalogError, OSError) as e:
+            raise CommandError(f'Nothing was imported: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {courses} courses and {lessons} lessons'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from courses.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the course search documents from the courses, lessons and authors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Courses indexed per upsert')
+
+    def handle(self, *args, batch_size, **options):
+        indexed = rebuild_index(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} courses'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from courses.models import Course, Lesson, SubscriptionCourse, count_subquery
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored student and lesson counters of courses and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Courses checked per UPDATE')
+        parser.add_argument('--dry-run', action='store_true', help='Report drifted courses without fixing them')
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+        repaired = 0
+
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            drifted = Course.objects.filter(pk__in=batch).with_counts().filter(
+                ~Q(students_count=F('counted_students')) | ~Q(lessons_count=F('counted_lessons'))
+            )
+            if dry_run:
+                repaired += drifted.count()
+                continue
+            with transaction.atomic():
+                repaired += drifted.update(
+                    students_count=count_subquery(SubscriptionCourse.objects.all(), 'course'),
+                    lessons_count=count_subquery(Lesson.objects.all(), 'course'),
+                )
+
+        verb = 'Found' if dry_run else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {repaired} of {len(ids)} courses with drifted counters'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses.analytics import rollup
+
+
+class Command(BaseCommand):
+    help = 'Add enrollments and lesson completions recorded since the last run to the course analytics rollups'
+
+    def handle(self, *args, **options):
+        window = rollup()
+        if window is None:
+            self.stdout.write('Rollups are up to date')
+            return
+        start, until = window
+        self.stdout.write(self.style.SUCCESS(f'Rolled up activity from {start.isoformat()} to {until.isoformat()}'))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:13
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_enrollments(apps, schema_editor):
+    # Keep the first enrollment of every (subscription, course) pair and
+    # recount the students of the courses that had duplicates, 0006 counted
+    # them already
+    Course = apps.get_model('courses', 'Course')
+    SubscriptionCourse = apps.get_model('courses', 'SubscriptionCourse')
+    first = (
+        SubscriptionCourse.objects.order_by()
+        .values('subscription', 'course')
+        .annotate(first_id=Min('pk'))
+        .values('first_id')
+    )
+    duplicates = SubscriptionCourse.objects.exclude(pk__in=first)
+    course_ids = set(duplicates.values_list('course', flat=True))
+    if not course_ids:
+        return
+    duplicates.delete()
+
+    students = (
+        SubscriptionCourse.objects.filter(course=OuterRef('pk'))
+        .order_by()
+        .values('course')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Course.objects.filter(pk__in=course_ids).update(students_count=Coalesce(Subquery(students), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_course_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_enrollments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscriptioncourse',
+            constraint=models.UniqueConstraint(fields=('subscription', 'course'), name='unique_subscription_course'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:16
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Value, ExpressionWrapper
+from django.db.models.functions import Coalesce, Least, NullIf
+
+
+def backfill_progress(apps, schema_editor):
+    SubscriptionCourse = apps.get_model('courses', 'SubscriptionCourse')
+    CompletedLesson = apps.get_model('courses', 'CompletedLesson')
+    Course = apps.get_model('courses', 'Course')
+
+    completed = (
+        CompletedLesson.objects.filter(subscription_course=OuterRef('pk'))
+        .order_by()
+        .values('subscription_course')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    SubscriptionCourse.objects.update(completed_lessons_count=Coalesce(Subquery(completed), 0))
+
+    lessons = Subquery(Course.objects.filter(pk=OuterRef('course_id')).values('lessons_count'))
+    percentage = ExpressionWrapper(
+        F('completed_lessons_count') * 100.0 / NullIf(lessons, 0),
+        output_field=models.DecimalField(max_digits=5, decimal_places=2),
+    )
+    SubscriptionCourse.objects.update(
+        completed_percentage=Least(Coalesce(percentage, Value(Decimal(0))), Value(Decimal(100)))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_unique_subscription_course'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptioncourse',
+            name='completed_lessons_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='subscriptioncourse',
+            name='completed_percentage',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:26
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, ExpressionWrapper, F, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Least, NullIf
+
+
+def remove_duplicate_completions(apps, schema_editor):
+    # Keep the first completion of every (subscription_course, lesson) pair
+    # and recount the progress of enrollments that had duplicates
+    CompletedLesson = apps.get_model('courses', 'CompletedLesson')
+    SubscriptionCourse = apps.get_model('courses', 'SubscriptionCourse')
+    Course = apps.get_model('courses', 'Course')
+    first = (
+        CompletedLesson.objects.order_by()
+        .values('subscription_course', 'lesson')
+        .annotate(first_id=Min('pk'))
+        .values('first_id')
+    )
+    duplicates = CompletedLesson.objects.exclude(pk__in=first)
+    affected = list(duplicates.order_by().values_list('subscription_course', flat=True).distinct())
+    if not affected:
+        return
+    duplicates.delete()
+
+    completed = (
+        CompletedLesson.objects.filter(subscription_course=OuterRef('pk'))
+        .order_by()
+        .values('subscription_course')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    enrollments = SubscriptionCourse.objects.filter(pk__in=affected)
+    enrollments.update(completed_lessons_count=Coalesce(Subquery(completed), 0))
+
+    lessons = Subquery(Course.objects.filter(pk=OuterRef('course_id')).values('lessons_count'))
+    percentage = ExpressionWrapper(
+        F('completed_lessons_count') * 100.0 / NullIf(lessons, 0),
+        output_field=models.DecimalField(max_digits=5, decimal_places=2),
+    )
+    enrollments.update(completed_percentage=Least(Coalesce(percentage, Value(Decimal(0))), Value(Decimal(100))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_subscriptioncourse_completed_lessons_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['course', 'created_at', 'id'], name='group_course_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['course', 'created_at', 'id'], name='lesson_course_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptioncourse',
+            index=models.Index(fields=['course', '-id'], name='subscriptioncourse_course_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_completions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='completedlesson',
+            constraint=models.UniqueConstraint(fields=('subscription_course', 'lesson'), name='unique_completed_lesson'),
+        ),
+        migrations.AlterField(
+            model_name='completedlesson',
+            name='subscription_course',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='courses.subscriptioncourse'),
+        ),
+        migrations.AlterField(
+            model_name='group',
+            name='course',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='courses.course'),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='course',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='lessons', to='courses.course'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptioncourse',
+            name='course',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='courses.course'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptioncourse',
+            name='subscription',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='courses.subscription'),
+        ),
+    ]
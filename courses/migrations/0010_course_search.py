@@ -0,0 +1,118 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SQLITE_CREATE = [
+    # External content table, rows are read back from the document table
+    '''
+    CREATE VIRTUAL TABLE courses_search_fts USING fts5(
+        title, author, lessons,
+        content='courses_coursesearchdocument', content_rowid='course_id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER courses_search_fts_insert AFTER INSERT ON courses_coursesearchdocument BEGIN
+        INSERT INTO courses_search_fts (rowid, title, author, lessons)
+        VALUES (new.course_id, new.title, new.author, new.lessons);
+    END
+    ''',
+    '''
+    CREATE TRIGGER courses_search_fts_delete AFTER DELETE ON courses_coursesearchdocument BEGIN
+        INSERT INTO courses_search_fts (courses_search_fts, rowid, title, author, lessons)
+        VALUES ('delete', old.course_id, old.title, old.author, old.lessons);
+    END
+    ''',
+    '''
+    CREATE TRIGGER courses_search_fts_update AFTER UPDATE ON courses_coursesearchdocument BEGIN
+        INSERT INTO courses_search_fts (courses_search_fts, rowid, title, author, lessons)
+        VALUES ('delete', old.course_id, old.title, old.author, old.lessons);
+        INSERT INTO courses_search_fts (rowid, title, author, lessons)
+        VALUES (new.course_id, new.title, new.author, new.lessons);
+    END
+    ''',
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS courses_search_fts_insert',
+    'DROP TRIGGER IF EXISTS courses_search_fts_delete',
+    'DROP TRIGGER IF EXISTS courses_search_fts_update',
+    'DROP TABLE IF EXISTS courses_search_fts',
+]
+
+
+def postgres_index():
+    # Imported here, django.contrib.postgres needs psycopg installed. The
+    # expression is spelled out so the migration keeps creating this index
+    # whatever courses.search becomes.
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    vector = (
+        SearchVector('title', weight='A', config='english')
+        + SearchVector('author', weight='B', config='english')
+        + SearchVector('lessons', weight='C', config='english')
+    )
+    return GinIndex(vector, name='course_search_vector_idx')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE_CREATE:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('courses', 'CourseSearchDocument'), postgres_index())
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE_DROP:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('courses', 'CourseSearchDocument'), postgres_index())
+
+
+def backfill_documents(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    CourseSearchDocument = apps.get_model('courses', 'CourseSearchDocument')
+
+    lessons = {}
+    for course_id, title in Lesson.objects.order_by('created_at', 'id').values_list('course_id', 'title'):
+        lessons.setdefault(course_id, []).append(title)
+
+    documents = []
+    for course in Course.objects.select_related('author').iterator(chunk_size=1000):
+        author = course.author
+        documents.append(CourseSearchDocument(
+            course=course,
+            title=course.title,
+            author=' '.join(part for part in (author.first_name, author.last_name, author.username) if part),
+            lessons='\n'.join(lessons.get(course.pk, [])),
+        ))
+    CourseSearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSearchDocument',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='courses.course')),
+                ('title', models.CharField(max_length=100)),
+                ('author', models.TextField()),
+                ('lessons', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
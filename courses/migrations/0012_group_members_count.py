@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_members_count(apps, schema_editor):
+    Group = apps.get_model('courses', 'Group')
+    counts = (
+        Group.members.through.objects.filter(group=OuterRef('pk'))
+        .order_by()
+        .values('group')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Group.objects.update(members_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='members_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_members_count, migrations.RunPython.noop),
+    ]
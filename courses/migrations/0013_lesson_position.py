@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+POSITION_GAP = 1024
+
+
+def backfill_positions(apps, schema_editor):
+    # Lessons keep their creation order, numbered through the old index
+    Lesson = apps.get_model('courses', 'Lesson')
+    preceding = (
+        Lesson.objects.filter(course=OuterRef('course'))
+        .filter(Q(created_at__lt=OuterRef('created_at')) | Q(created_at=OuterRef('created_at'), pk__lte=OuterRef('pk')))
+        .order_by()
+        .values('course')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Lesson.objects.update(position=Coalesce(Subquery(preceding), 0) * POSITION_GAP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_group_members_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='position',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='lesson',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='lesson',
+            name='lesson_course_created_at_idx',
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['course', 'position', 'id'], name='lesson_course_position_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_lesson_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='completedlesson',
+            name='client_completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
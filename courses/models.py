@@ -1,48 +1,174 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When, ExpressionWrapper
+from django.db.models.lookups import GreaterThanOrEqual
+from django.db.models.functions import Coalesce, Least, NullIf
 
 from accounts.models import CustomUser
 
 
-class Course(models.Model):
+def count_subquery(queryset, field):
+    '''
+    Correlated COUNT(*) of ``queryset`` rows whose ``field`` is the outer row
+    '''
+    counts = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+class StoredCountersMixin:
+    '''
+    Leave ``counter_fields`` out of save() on updates. They are moved by
+    set-based UPDATEs, writing back the values an instance was loaded with
+    would undo the ones that ran since.
+    '''
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            skipped = set(self.counter_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class CourseQuerySet(models.QuerySet):
+    def with_counts(self):
+        '''
+        Annotate the real student and lesson counts, to check the stored ones
+        '''
+        return self.annotate(
+            counted_students=count_subquery(SubscriptionCourse.objects.all(), 'course'),
+            counted_lessons=count_subquery(Lesson.objects.all(), 'course'),
+        )
+
+    def adjust_counters(self, students=0, lessons=0, **fields):
+        '''
+        Atomically shift the stored counters by the given deltas
+        '''
+        if students:
+            fields['students_count'] = F('students_count') + students
+        if lessons:
+            fields['lessons_count'] = F('lessons_count') + lessons
+        return self.update(**fields) if fields else 0
+
+    def for_list(self, lessons=True):
+        '''
+        Everything CourseSerializer reads, in a constant number of queries
+        '''
+        queryset = self.select_related('author')
+        if lessons:
+            queryset = queryset.prefetch_related('lessons')
+        return queryset
+
+
+class Course(StoredCountersMixin, models.Model):
     title = models.CharField(max_length=100)
     author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='courses')
     price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by courses.signals, repaired by `manage.py recount_courses`
+    students_count = models.PositiveIntegerField(default=0, editable=False)
+    lessons_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CourseQuerySet.as_manager()
+    counter_fields = ['students_count', 'lessons_count']
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='course_created_at_id_idx'),
+        ]
     
     def __str__(self):
         return f'{self.title} | {self.author} | {self.price}'
     
     @property
     def get_student_count(self):
-        return self.enrollments.count()
+        return self.students_count
     
     @property
     def get_lessons_count(self):
-        return self.lessons.count()
+        return self.lessons_count
+
 
 
+# Space between the positions of consecutive lessons, a lesson moved
+# between two others takes the middle of their gap
+POSITION_GAP = 1024
 
-class Lesson(models.Model):
+
+class Lesson(StoredCountersMixin, models.Model):
     title = models.CharField(max_length=100)
-    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lessons')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lessons', db_index=False)
     video_url = models.URLField()
+    # Set by courses.services, new lessons go last
+    position = models.PositiveIntegerField(editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Moves write the position with an UPDATE
+    counter_fields = ['position']
+    
+    class Meta:
+        ordering = ['position', 'id']
+        indexes = [
+            # Lessons of a course in syllabus order
+            models.Index(fields=['course', 'position', 'id'], name='lesson_course_position_idx'),
+        ]
+    
     def __str__(self):
         return f'{self.title} | {self.course} |'
 
 
-class Group(models.Model):
+class CourseSearchDocument(models.Model):
+    '''
+    Text of a course as the search index sees it. Maintained by
+    courses.search, rebuilt by `manage.py rebuild_search_index`. On SQLite
+    triggers copy it into the courses_search_fts FTS5 table, which Django
+    drops if it ever rebuilds this table in a migration.
+    '''
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title = models.CharField(max_length=100)
+    author = models.TextField()
+    lessons = models.TextField(blank=True)
+
+
+class GroupQuerySet(models.QuerySet):
+    def recount_members(self):
+        '''
+        Recompute members_count from the membership rows
+        '''
+        return self.update(members_count=count_subquery(Group.members.through.objects.all(), 'group'))
+
+
+class Group(StoredCountersMixin, models.Model):
     name = models.CharField(max_length=100)
-    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, db_index=False)
     members = models.ManyToManyField(CustomUser)
+    # Kept in step by the m2m_changed signal and courses.services
+    members_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = GroupQuerySet.as_manager()
+    counter_fields = ['members_count']
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'created_at', 'id'], name='group_course_created_at_idx'),
+        ]
+    
     def __str__(self):
-        return f'{self.name} | {self.course} | {self.members.count()} members'
+        return f'{self.name} | {self.course} | {self.members_count} members'
 
 
 class Subscription(models.Model):
@@ -50,23 +176,129 @@ class Subscription(models.Model):
     courses = models.ManyToManyField(Course, through='SubscriptionCourse', related_name='enrollments')
     
 
+def progress_percentage(completed):
+    '''
+    completed_percentage for ``completed`` lessons out of the stored lesson
+    count of the row's course, usable in a set-based UPDATE
+    '''
+    lessons = Subquery(Course.objects.filter(pk=OuterRef('course_id')).values('lessons_count'))
+    percentage = ExpressionWrapper(
+        completed * 100.0 / NullIf(lessons, 0),
+        output_field=models.DecimalField(max_digits=5, decimal_places=2),
+    )
+    return Least(Coalesce(percentage, Value(Decimal(0))), Value(Decimal(100)))
+
+
+class SubscriptionCourseQuerySet(models.QuerySet):
+    def refresh_progress(self):
+        '''
+        Recompute completed_percentage from the stored counters
+        '''
+        return self.update(completed_percentage=progress_percentage(F('completed_lessons_count')))
+
+    def complete_lesson(self, ended_at):
+        '''
+        Count one more completed lesson, finishing the course when it was the last one
+        '''
+        completed = F('completed_lessons_count') + 1
+        percentage = progress_percentage(completed)
+        return self.update(
+            completed_lessons_count=completed,
+            completed_percentage=percentage,
+            ended_at=Coalesce(F('ended_at'), Case(When(GreaterThanOrEqual(percentage, 100), then=Value(ended_at)))),
+        )
+
+    def recount_completed_lessons(self, ended_at):
+        '''
+        Recount completed lessons from the stored completions, finishing the
+        courses that are now complete
+        '''
+        completed = count_subquery(CompletedLesson.objects.all(), 'subscription_course')
+        percentage = progress_percentage(completed)
+        return self.update(
+            completed_lessons_count=completed,
+            completed_percentage=percentage,
+            ended_at=Coalesce(F('ended_at'), Case(When(GreaterThanOrEqual(percentage, 100), then=Value(ended_at)))),
+        )
+
+
 class SubscriptionCourse(models.Model):
-    subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE)
-    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    # Both foreign keys lead a composite index below
+    subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE, db_index=False)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, db_index=False)
     started_at = models.DateTimeField(auto_now_add=True)
     ended_at = models.DateTimeField(null=True)
     completed_lessons = models.ManyToManyField(Lesson, through='CompletedLesson')
-    completed_percentage = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    completed_lessons_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    
+    objects = SubscriptionCourseQuerySet.as_manager()
     
     class Meta:
         ordering = ['-id']
+        indexes = [
+            # Enrollments of a course, newest first
+            models.Index(fields=['course', '-id'], name='subscriptioncourse_course_idx'),
+            # Enrollments started and finished since the analytics watermark
+            models.Index(fields=['started_at'], name='subscriptioncourse_started_idx'),
+            models.Index(fields=['ended_at'], name='subscriptioncourse_ended_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['subscription', 'course'], name='unique_subscription_course'),
+        ]
 
 
 class CompletedLesson(models.Model):
-    subscription_course = models.ForeignKey(SubscriptionCourse, on_delete=models.CASCADE)
+    subscription_course = models.ForeignKey(SubscriptionCourse, on_delete=models.CASCADE, db_index=False)
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
     completed_at = models.DateTimeField(auto_now_add=True)
+    # When an offline client says the lesson was completed. completed_at
+    # stays the time it was stored, which the analytics watermark follows.
+    client_completed_at = models.DateTimeField(null=True, blank=True)
     score = models.PositiveIntegerField(default=0)
     
     class Meta:
         ordering = ['-id']
+        indexes = [
+            # New completions since the analytics watermark
+            models.Index(fields=['completed_at'], name='completedlesson_completed_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['subscription_course', 'lesson'], name='unique_completed_lesson'),
+        ]
+
+
+class CourseDailyStats(models.Model):
+    '''
+    Activity of a course on one day, rolled up by courses.analytics
+    '''
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_stats', db_index=False)
+    date = models.DateField()
+    enrollments = models.PositiveIntegerField(default=0)
+    # Enrollments that finished the course that day
+    completions = models.PositiveIntegerField(default=0)
+    lesson_completions = models.PositiveIntegerField(default=0)
+    score_sum = models.PositiveBigIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'date'], name='unique_course_daily_stats'),
+        ]
+
+
+class LessonStats(models.Model):
+    '''
+    All-time completions of a lesson, rolled up by courses.analytics
+    '''
+    lesson = models.OneToOneField(Lesson, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    completions = models.PositiveIntegerField(default=0)
+    score_sum = models.PositiveBigIntegerField(default=0)
+
+
+class AnalyticsWatermark(models.Model):
+    '''
+    Rows created up to ``processed_until`` are part of the rollups
+    '''
+    name = models.CharField(max_length=50, primary_key=True)
+    processed_until = models.DateTimeField()
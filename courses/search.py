@@ -0,0 +1,128 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from accounts.models import CustomUser
+from .models import Course, CourseSearchDocument, Lesson
+
+
+FTS_TABLE = 'courses_search_fts'
+POSTGRES_CONFIG = 'english'
+POSTGRES_INDEX = 'course_search_vector_idx'
+
+# Relative weight of a match in the title, author and lesson titles
+SQLITE_WEIGHTS = (10.0, 5.0, 1.0)
+
+WORDS = re.compile(r'\w+')
+
+
+def author_name(user):
+    return ' '.join(part for part in (user.first_name, user.last_name, user.username) if part)
+
+
+def build_documents(course_ids):
+    courses = Course.objects.filter(pk__in=course_ids).select_related('author').only(
+        'title', 'author__username', 'author__first_name', 'author__last_name'
+    )
+    lessons = {}
+    for course_id, title in (
+        Lesson.objects.filter(course__in=course_ids).order_by('position', 'id').values_list('course_id', 'title')
+    ):
+        lessons.setdefault(course_id, []).append(title)
+    return [
+        CourseSearchDocument(
+            course=course,
+            title=course.title,
+            author=author_name(course.author),
+            lessons='\n'.join(lessons.get(course.pk, [])),
+        )
+        for course in courses
+    ]
+
+
+def index_courses(course_ids):
+    '''
+    Rebuild the search documents of the given courses in one upsert
+    '''
+    CourseSearchDocument.objects.bulk_create(
+        build_documents(course_ids),
+        update_conflicts=True,
+        unique_fields=['course'],
+        update_fields=['title', 'author', 'lessons'],
+    )
+
+
+def index_course_on_commit(course_id):
+    # After commit, so a course deleted in the same transaction is not
+    # written back while its cascade runs
+    transaction.on_commit(lambda: index_courses([course_id]))
+
+
+def rename_author(user: CustomUser):
+    CourseSearchDocument.objects.filter(course__author=user).exclude(author=author_name(user)).update(
+        author=author_name(user)
+    )
+
+
+def rebuild_index(batch_size=1000):
+    '''
+    Index every course, returns how many were indexed
+    '''
+    ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            index_courses(ids[start:start + batch_size])
+    return len(ids)
+
+
+def search_vector():
+    # Imported here, django.contrib.postgres needs psycopg installed. The
+    # GIN index of migration 0010 is on this exact expression, a change
+    # needs a migration replacing that index.
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('title', weight='A', config=POSTGRES_CONFIG)
+        + SearchVector('author', weight='B', config=POSTGRES_CONFIG)
+        + SearchVector('lessons', weight='C', config=POSTGRES_CONFIG)
+    )
+
+
+def postgres_search(words, limit, offset):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    query = SearchQuery(' '.join(words), config=POSTGRES_CONFIG)
+    # Filtering on the exact indexed expression lets the planner use the GIN index
+    return list(
+        CourseSearchDocument.objects.annotate(search=search_vector())
+        .filter(search=query)
+        .annotate(rank=SearchRank(F('search'), query))
+        .order_by('-rank', 'pk')
+        .values_list('pk', flat=True)[offset:offset + limit]
+    )
+
+
+def sqlite_search(words, limit, offset):
+    # Every word quoted so user input cannot use the FTS5 query syntax
+    match = ' '.join(f'"{word}"' for word in words)
+    weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT %s OFFSET %s',
+            [match, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_course_ids(query, limit, offset=0):
+    '''
+    Ids of the courses matching every word of ``query``, best match first
+    '''
+    words = WORDS.findall(query)
+    if not words:
+        return []
+    if connection.vendor == 'postgresql':
+        return postgres_search(words, limit, offset)
+    return sqlite_search(words, limit, offset)
@@ -0,0 +1,323 @@
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from accounts.ledger import InsufficientPoints, charge
+from accounts.models import CustomUser, Balance, PointsEntry
+from .cache import bump_course_version_on_commit
+from .models import POSITION_GAP, Course, Group, Lesson, Subscription, SubscriptionCourse, CompletedLesson
+
+
+class EnrollmentError(Exception):
+    pass
+
+
+class NotEnoughPoints(EnrollmentError):
+    pass
+
+
+class AlreadyEnrolled(EnrollmentError):
+    pass
+
+
+USER_NOT_FOUND = 'User not found'
+ALREADY_ENROLLED = 'Already enrolled in this course'
+NOT_ENOUGH_POINTS = 'Not enough points'
+
+ALREADY_MEMBER = 'Already a member of this group'
+NOT_A_MEMBER = 'Not a member of this group'
+
+LESSON_COMPLETED = 'completed'
+LESSON_ALREADY_COMPLETED = 'already_completed'
+LESSON_NOT_FOUND = 'not_found'
+LESSON_NOT_ENROLLED = 'not_enrolled'
+
+
+def user_subscription(user):
+    '''
+    Value for a ``subscription`` filter: the id users resolved by
+    accounts.auth carry, otherwise a subquery on the user
+    '''
+    if getattr(user, 'subscription_pk', None) is not None:
+        return user.subscription_pk
+    return Subscription.objects.filter(user=user).values('pk')[:1]
+
+
+def enrollments_key(subscription_id):
+    return f'enrollments:{subscription_id}'
+
+
+def enrolled_courses(user):
+    '''
+    Ids of every course ``user`` is enrolled in. Cached per subscription for
+    users resolved by accounts.auth, one query by user for the others. The
+    cached set is read from the primary, a lagging replica would keep a
+    course that was just paid for out of it until the entry expires.
+    '''
+    if not user.is_authenticated:
+        return frozenset()
+    subscription_id = getattr(user, 'subscription_pk', None)
+    if subscription_id is None:
+        return frozenset(SubscriptionCourse.objects.filter(subscription__user=user).values_list('course_id', flat=True))
+
+    key = enrollments_key(subscription_id)
+    course_ids = cache.get(key)
+    if course_ids is None:
+        course_ids = frozenset(
+            SubscriptionCourse.objects.using(DEFAULT_DB_ALIAS)
+            .filter(subscription_id=subscription_id)
+            .values_list('course_id', flat=True)
+        )
+        cache.set(key, course_ids, settings.ENROLLMENT_CACHE_TIMEOUT)
+    return course_ids
+
+
+def enrolled_course_ids(user, course_ids):
+    '''
+    The subset of ``course_ids`` ``user`` is enrolled in
+    '''
+    return enrolled_courses(user) & set(course_ids)
+
+
+def invalidate_enrollments_on_commit(subscription_ids):
+    keys = [enrollments_key(subscription_id) for subscription_id in subscription_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def price_in_points(course):
+    return math.ceil(course.price)
+
+
+def enroll(user, course):
+    '''
+    Charge the user and enroll them in the course in a single transaction.
+    The balance is charged first, its row stays locked until commit as it
+    is in bulk_enroll(), and the unique (subscription, course) constraint
+    rejects a second enrollment.
+    '''
+    price = price_in_points(course)
+    subscription_id = getattr(user, 'subscription_pk', None)
+    if subscription_id is None:
+        subscription_id = Subscription.objects.values_list('pk', flat=True).get(user=user)
+
+    with transaction.atomic():
+        try:
+            charge(user.pk, price)
+        except InsufficientPoints:
+            raise NotEnoughPoints
+        try:
+            enrollment = SubscriptionCourse.objects.create(subscription_id=subscription_id, course=course)
+        except IntegrityError:
+            raise AlreadyEnrolled
+        PointsEntry.objects.create(user_id=user.pk, amount=-price, kind=PointsEntry.ENROLLMENT, enrollment=enrollment)
+    return enrollment
+
+
+def bulk_enroll(course, user_ids, batch_size=500):
+    '''
+    Enroll many users in a course with a fixed number of queries.
+    Returns the enrolled user ids and a ``{user_id: reason}`` dict of failures.
+    '''
+    user_ids = list(dict.fromkeys(user_ids))
+    price = price_in_points(course)
+    subscriptions = dict(Subscription.objects.filter(user_id__in=user_ids).values_list('user_id', 'pk'))
+    enrolled, failed = [], {}
+
+    with transaction.atomic():
+        # Single enrollments lock the balance before inserting, so once these
+        # rows are locked the enrollments read below cannot change under us
+        funded = set(
+            Balance.objects.select_for_update()
+            .filter(user_id__in=subscriptions, points__gte=price)
+            .values_list('user_id', flat=True)
+        )
+        enrolled_already = set(
+            SubscriptionCourse.objects.filter(course=course, subscription__in=subscriptions.values())
+            .values_list('subscription__user_id', flat=True)
+        )
+        for user_id in user_ids:
+            if user_id not in subscriptions:
+                failed[user_id] = USER_NOT_FOUND
+            elif user_id in enrolled_already:
+                failed[user_id] = ALREADY_ENROLLED
+            elif user_id not in funded:
+                failed[user_id] = NOT_ENOUGH_POINTS
+            else:
+                enrolled.append(user_id)
+
+        if enrolled:
+            Balance.objects.filter(user_id__in=enrolled, points__gte=price).update(points=F('points') - price)
+            enrollments = SubscriptionCourse.objects.bulk_create(
+                [SubscriptionCourse(subscription_id=subscriptions[user_id], course=course) for user_id in enrolled],
+                batch_size=batch_size,
+            )
+            PointsEntry.objects.bulk_create(
+                [
+                    PointsEntry(user_id=user_id, amount=-price, kind=PointsEntry.ENROLLMENT, enrollment=enrollment)
+                    for user_id, enrollment in zip(enrolled, enrollments)
+                ],
+                batch_size=batch_size,
+            )
+            # bulk_create sends no post_save, keep the counters and cache in step here
+            Course.objects.filter(pk=course.pk).adjust_counters(students=len(enrolled))
+            bump_course_version_on_commit(course.pk)
+            invalidate_enrollments_on_commit([subscriptions[user_id] for user_id in enrolled])
+
+    return enrolled, failed
+
+
+def complete_lessons(user, items, batch_size=500):
+    '''
+    Record a batch of ``{'lesson_id', 'score'}`` completions for ``user``
+    with a fixed number of queries, an optional ``completed_at`` is kept as
+    the client's completion time. Every enrollment touched is recounted
+    once. Returns one ``{'lesson_id', 'status'}`` per item, in order.
+    '''
+    now = timezone.now()
+    lesson_ids = {item['lesson_id'] for item in items}
+    courses = dict(Lesson.objects.filter(pk__in=lesson_ids).values_list('pk', 'course_id'))
+    enrollments = dict(
+        SubscriptionCourse.objects.filter(subscription=user_subscription(user), course_id__in=set(courses.values()))
+        .values_list('course_id', 'pk')
+    )
+    done = set(
+        CompletedLesson.objects.filter(subscription_course_id__in=enrollments.values(), lesson_id__in=lesson_ids)
+        .values_list('lesson_id', flat=True)
+    )
+
+    results, completions = [], []
+    for item in items:
+        lesson_id = item['lesson_id']
+        if lesson_id not in courses:
+            status = LESSON_NOT_FOUND
+        elif courses[lesson_id] not in enrollments:
+            status = LESSON_NOT_ENROLLED
+        elif lesson_id in done:
+            status = LESSON_ALREADY_COMPLETED
+        else:
+            status = LESSON_COMPLETED
+            done.add(lesson_id)
+            completions.append(CompletedLesson(
+                subscription_course_id=enrollments[courses[lesson_id]],
+                lesson_id=lesson_id,
+                # Clocks of offline devices drift, none is taken to be ahead of the server
+                client_completed_at=min(item['completed_at'], now) if item.get('completed_at') else None,
+                score=item.get('score', 0),
+            ))
+        results.append({'lesson_id': lesson_id, 'status': status})
+
+    if completions:
+        with transaction.atomic():
+            # A concurrent sync may have stored some of these, the recount
+            # below reads what actually landed
+            CompletedLesson.objects.bulk_create(completions, batch_size=batch_size, ignore_conflicts=True)
+            SubscriptionCourse.objects.filter(
+                pk__in={completion.subscription_course_id for completion in completions}
+            ).recount_completed_lessons(ended_at=now)
+    return results
+
+
+def add_members(group, user_ids, batch_size=500):
+    '''
+    Add many users to a group with a fixed number of queries.
+    Returns the added user ids and a ``{user_id: reason}`` dict of failures.
+    '''
+    user_ids = list(dict.fromkeys(user_ids))
+    Membership = Group.members.through
+    found = set(CustomUser.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    members = set(
+        Membership.objects.filter(group=group, customuser_id__in=found).values_list('customuser_id', flat=True)
+    )
+    added, failed = [], {}
+    for user_id in user_ids:
+        if user_id not in found:
+            failed[user_id] = USER_NOT_FOUND
+        elif user_id in members:
+            failed[user_id] = ALREADY_MEMBER
+        else:
+            added.append(user_id)
+
+    if added:
+        with transaction.atomic():
+            # Rows added concurrently are skipped, the recount reads what landed
+            Membership.objects.bulk_create(
+                [Membership(group_id=group.pk, customuser_id=user_id) for user_id in added],
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+            Group.objects.filter(pk=group.pk).recount_members()
+    return added, failed
+
+
+def remove_members(group, user_ids):
+    '''
+    Remove many users from a group with a fixed number of queries.
+    Returns the removed user ids and a ``{user_id: reason}`` dict of failures.
+    '''
+    user_ids = list(dict.fromkeys(user_ids))
+    Membership = Group.members.through
+    memberships = Membership.objects.filter(group=group, customuser_id__in=user_ids)
+    members = set(memberships.values_list('customuser_id', flat=True))
+    removed = [user_id for user_id in user_ids if user_id in members]
+    failed = {user_id: NOT_A_MEMBER for user_id in user_ids if user_id not in members}
+
+    if removed:
+        with transaction.atomic():
+            memberships.filter(customuser_id__in=removed).delete()
+            Group.objects.filter(pk=group.pk).recount_members()
+    return removed, failed
+
+
+def next_lesson_position(course_id):
+    last = Lesson.objects.filter(course_id=course_id).aggregate(last=Max('position'))['last']
+    return (last or 0) + POSITION_GAP
+
+
+def renumber_lessons(course_id, batch_size=500):
+    '''
+    Space the lessons of a course POSITION_GAP apart again, in their current order
+    '''
+    lessons = list(Lesson.objects.filter(course_id=course_id).order_by('position', 'id').only('pk'))
+    for number, lesson in enumerate(lessons, 1):
+        lesson.position = number * POSITION_GAP
+    Lesson.objects.bulk_update(lessons, ['position'], batch_size=batch_size)
+
+
+def position_gap(lesson, after_id):
+    '''
+    Positions around the slot right after lesson ``after_id``, or before the
+    first lesson when it is None. The upper one is None at the end.
+    '''
+    others = Lesson.objects.filter(course_id=lesson.course_id).exclude(pk=lesson.pk)
+    following = others
+    lower = 0
+    if after_id is not None:
+        lower = others.values_list('position', flat=True).get(pk=after_id)
+        following = others.filter(Q(position__gt=lower) | Q(position=lower, pk__gt=after_id))
+    upper = following.order_by('position', 'id').values_list('position', flat=True).first()
+    return lower, upper
+
+
+def move_lesson(lesson, after_id=None):
+    '''
+    Move ``lesson`` right after lesson ``after_id`` of its course, first when
+    it is None. Only the moved row is written, unless its slot has no room
+    left and the course is renumbered first. Raises Lesson.DoesNotExist
+    when ``after_id`` is not another lesson of the course.
+    '''
+    with transaction.atomic():
+        # Locks the course row, moves within a course run one at a time
+        Course.objects.filter(pk=lesson.course_id).adjust_counters(updated_at=timezone.now())
+        lower, upper = position_gap(lesson, after_id)
+        if upper is not None and upper - lower < 2:
+            renumber_lessons(lesson.course_id)
+            lower, upper = position_gap(lesson, after_id)
+
+        lesson.position = lower + POSITION_GAP if upper is None else (lower + upper) // 2
+        Lesson.objects.filter(pk=lesson.pk).update(position=lesson.position)
+        bump_course_version_on_commit(lesson.course_id)
+    return lesson
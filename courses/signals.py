@@ -1,20 +1,159 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.utils import timezone
 
 from accounts.models import CustomUser
-from .models import Subscription, Lesson
+from jobs.queue import enqueue
+from .models import Course, Group, Subscription, SubscriptionCourse, Lesson
+from .cache import bump_course_version_on_commit
+from .search import index_course_on_commit, rename_author
+from .services import invalidate_enrollments_on_commit, next_lesson_position
+from .tasks import refresh_course_progress
 
 
 @receiver(post_save, sender=CustomUser)
 def post_save_subscription(sender, instance: CustomUser, created, **kwargs):
     if created:
-        subscription = Subscription.objects.create(user=sender)
+        subscription = Subscription.objects.create(user=instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def post_save_author_search(sender, instance: CustomUser, created, update_fields=None, **kwargs):
+    # Logins only save last_login
+    if created or (update_fields and not {'first_name', 'last_name', 'username'} & set(update_fields)):
+        return
+    rename_author(instance)
+
+
+@receiver(post_save, sender=Course)
+def post_save_course_search(sender, instance: Course, **kwargs):
+    index_course_on_commit(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_course_cache(sender, instance: Course, **kwargs):
+    bump_course_version_on_commit(instance.pk)
+
+
+def deleting_course(origin):
+    '''
+    Whether a delete comes from the cascade of a course, whose lessons and
+    enrollments go with it and need no counting
+    '''
+    if isinstance(origin, QuerySet):
+        return origin.model is Course
+    return isinstance(origin, Course)
+
+
+@receiver(pre_delete, sender=Course)
+def pre_delete_course_enrollments(sender, instance: Course, **kwargs):
+    # One query for every enrolled set the course leaves, instead of one
+    # post_delete per enrollment
+    invalidate_enrollments_on_commit(
+        SubscriptionCourse.objects.filter(course=instance).values_list('subscription_id', flat=True)
+    )
+
+
+def enqueue_progress_refresh(course_id):
+    # Fans out to every subscriber, so it runs in the worker and not the request
+    enqueue(refresh_course_progress, idempotency_key=f'refresh-course-progress:{course_id}', course_id=course_id)
+
+
+@receiver(pre_save, sender=Lesson)
+def pre_save_lesson_position(sender, instance: Lesson, **kwargs):
+    if instance.position is None:
+        instance.position = next_lesson_position(instance.course_id)
 
 
 @receiver(post_save, sender=Lesson)
-def post_save_course(sender, instance: Lesson, created, **kwargs):
+def post_save_lesson_counters(sender, instance: Lesson, created, **kwargs):
+    # Lessons are part of the course payload, keep its Last-Modified honest
+    Course.objects.filter(pk=instance.course_id).adjust_counters(
+        lessons=1 if created else 0,
+        updated_at=timezone.now(),
+    )
+    if created:
+        enqueue_progress_refresh(instance.course_id)
+    bump_course_version_on_commit(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def index_lesson_course(sender, instance: Lesson, origin=None, **kwargs):
+    # A deleted course takes its search document with it
+    if not deleting_course(origin):
+        index_course_on_commit(instance.course_id)
+
+
+@receiver(pre_delete, sender=Lesson)
+def pre_delete_lesson_progress(sender, instance: Lesson, origin=None, **kwargs):
+    # The cascade removes the completions without touching the counters,
+    # unless it removes the enrollments holding them too
+    if deleting_course(origin):
+        return
+    SubscriptionCourse.objects.filter(completedlesson__lesson=instance).update(
+        completed_lessons_count=F('completed_lessons_count') - 1
+    )
+
+
+@receiver(post_delete, sender=Lesson)
+def post_delete_lesson_counters(sender, instance: Lesson, origin=None, **kwargs):
+    if deleting_course(origin):
+        return
+    Course.objects.filter(pk=instance.course_id).adjust_counters(lessons=-1, updated_at=timezone.now())
+    enqueue_progress_refresh(instance.course_id)
+    bump_course_version_on_commit(instance.course_id)
+
+
+@receiver(post_save, sender=SubscriptionCourse)
+def post_save_enrollment_counters(sender, instance: SubscriptionCourse, created, **kwargs):
+    # Progress updates do not change the course payload
     if created:
-        for obj in instance.course.subscriptioncourse.all():
-            obj.completed_percentage = (obj.completed_lessons.count() / obj.course.lessons.count) * 100
-            obj.save()
-    
\ No newline at end of file
+        Course.objects.filter(pk=instance.course_id).adjust_counters(students=1)
+        bump_course_version_on_commit(instance.course_id)
+        invalidate_enrollments_on_commit([instance.subscription_id])
+
+
+@receiver(post_delete, sender=SubscriptionCourse)
+def post_delete_enrollment_counters(sender, instance: SubscriptionCourse, origin=None, **kwargs):
+    if deleting_course(origin):
+        return
+    Course.objects.filter(pk=instance.course_id).adjust_counters(students=-1)
+    bump_course_version_on_commit(instance.course_id)
+    invalidate_enrollments_on_commit([instance.subscription_id])
+
+
+@receiver(m2m_changed, sender=Subscription.courses.through)
+def m2m_changed_enrollment_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    # The m2m manager bulk inserts through rows without post_save, removals
+    # go through a queryset delete and are counted by post_delete above
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        Course.objects.filter(pk=instance.pk).adjust_counters(students=len(pk_set))
+        bump_course_version_on_commit(instance.pk)
+        invalidate_enrollments_on_commit(pk_set)
+    else:
+        Course.objects.filter(pk__in=pk_set).adjust_counters(students=1)
+        for course_id in pk_set:
+            bump_course_version_on_commit(course_id)
+        invalidate_enrollments_on_commit([instance.pk])
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def m2m_changed_members_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action == 'pre_clear':
+            # The user leaves every group, counted while the rows are still there
+            Group.objects.filter(members=instance).update(members_count=F('members_count') - 1)
+        elif action in ('post_add', 'post_remove') and pk_set:
+            Group.objects.filter(pk__in=pk_set).recount_members()
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        # Removals list the requested ids whether they were members or not
+        Group.objects.filter(pk=instance.pk).recount_members()
+
+
+@receiver(pre_delete, sender=CustomUser)
+def pre_delete_member_counts(sender, instance: CustomUser, **kwargs):
+    # The cascade removes the membership rows without m2m_changed
+    Group.objects.filter(members=instance).update(members_count=F('members_count') - 1)
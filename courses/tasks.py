@@ -0,0 +1,11 @@
+from jobs.queue import task
+
+from .models import SubscriptionCourse
+
+
+@task
+def refresh_course_progress(course_id):
+    '''
+    Recompute the progress of every subscriber after the course's lessons changed
+    '''
+    SubscriptionCourse.objects.filter(course_id=course_id).refresh_progress()
@@ -1,3 +1,1398 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction, IntegrityError
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APITestCase
+
+from accounts.auth import resolve_user
+from api.v1.courses.async_views import AsyncReadView
+from api.v1.courses.views import CourseAPIView
+from accounts.models import CustomUser, PointsEntry
+from core.db import ReplicaRouter, replica_reads
+from core.profiling import slow_requests
+from jobs.models import Job
+from jobs.queue import run_pending
+from .models import Course, Lesson, Group, SubscriptionCourse, CompletedLesson, CourseSearchDocument
+from .analytics import rollup
+from .cache import get_course_version
+from .catalog import JSON, CatalogError, import_catalog, read_catalog, read_json_array, spool
+from .search import search_course_ids
+from .services import enroll, enrolled_course_ids, EnrollmentError
+
+
+def create_user(username, **kwargs):
+    return CustomUser.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        **kwargs
+    )
+
+
+def create_course(author, title='Course', price=10, lessons=0):
+    course = Course.objects.create(title=title, author=author, price=price)
+    for i in range(lessons):
+        Lesson.objects.create(title=f'Lesson {i}', course=course, video_url='https://example.com/video')
+    return course
+
+
+class CourseAPITestCase(APITestCase):
+    def setUp(self):
+        # Course ids are reused between tests, cached payloads must not be
+        cache.clear()
+        self.author = create_user('author')
+        self.client.force_authenticate(self.author)
+
+
+class CourseListQueryTest(CourseAPITestCase):
+    def count_list_queries(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('course-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data['results']
+
+    def test_query_count_is_constant(self):
+        create_course(self.author, lessons=2)
+        one_course_queries, _ = self.count_list_queries(expand='lessons,author')
+
+        for i in range(5):
+            create_course(self.author, title=f'Course {i}', lessons=3)
+        many_courses_queries, data = self.count_list_queries(expand='lessons,author')
+
+        self.assertEqual(one_course_queries, many_courses_queries)
+        self.assertEqual(len(data), 6)
+
+    def test_counts_are_serialized(self):
+        course = create_course(self.author, lessons=3)
+        student = create_user('student')
+        student.subscription.courses.add(course)
+
+        _, data = self.count_list_queries(expand='lessons')
+
+        self.assertEqual(data[0]['lessons_count'], 3)
+        self.assertEqual(data[0]['students_count'], 1)
+        self.assertEqual(len(data[0]['lessons']), 3)
+
+
+class ListPaginationTest(CourseAPITestCase):
+    def collect_pages(self, url, **params):
+        results = []
+        response = self.client.get(url, {'page_size': 2, **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            results.extend(response.data['results'])
+            if response.data['next'] is None:
+                return results
+            response = self.client.get(response.data['next'])
+
+    def test_course_cursor_walks_every_course_once(self):
+        courses = [create_course(self.author, title=f'Course {i}') for i in range(5)]
+
+        results = self.collect_pages(reverse('course-list'))
+
+        self.assertEqual([course['id'] for course in results], [course.id for course in reversed(courses)])
+
+    def test_lesson_cursor(self):
+        course = create_course(self.author, lessons=5)
+
+        results = self.collect_pages(reverse('lesson-list', args=[course.pk]))
+
+        self.assertEqual(len({lesson['id'] for lesson in results}), 5)
+
+    def test_course_list_collapses_nested_fields(self):
+        create_course(self.author, lessons=2)
+
+        course = self.client.get(reverse('course-list')).data['results'][0]
+
+        self.assertNotIn('lessons', course)
+        self.assertEqual(course['author'], self.author.pk)
+
+    def test_course_list_fields(self):
+        create_course(self.author, lessons=2)
+
+        course = self.client.get(reverse('course-list'), {'fields': 'id,title'}).data['results'][0]
+
+        self.assertEqual(set(course), {'id', 'title'})
+
+    def test_group_list_is_slim(self):
+        course = create_course(self.author)
+        group = Group.objects.create(name='Group', course=course)
+        group.members.add(self.author)
+        url = reverse('group-list', args=[course.pk])
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url).data['results'][0]
+
+        self.assertEqual(data['course']['id'], course.pk)
+        self.assertNotIn('lessons', data['course'])
+        self.assertNotIn('members', data)
+        self.assertEqual(data['members_count'], 1)
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+
+class CourseCacheTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course = create_course(self.author, lessons=2)
+        self.url = reverse('course-detail', args=[self.course.pk])
+
+    def test_cached_detail_skips_the_database(self):
+        # As authenticated in production, with the enrolled set cached too
+        self.client.force_authenticate(resolve_user(self.author.pk))
+        first = self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.data, second.data)
+        self.assertFalse([query for query in ctx.captured_queries if 'courses_' in query['sql']])
+
+    def test_etag_answers_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_lesson_change_invalidates(self):
+        detail = self.client.get(self.url)
+        lessons = self.client.get(reverse('lesson-list', args=[self.course.pk]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(title='New', course=self.course, video_url='https://example.com/video')
+
+        self.assertEqual(self.client.get(self.url).data['lessons_count'], 3)
+        self.assertEqual(len(self.client.get(reverse('lesson-list', args=[self.course.pk])).data['results']), 3)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=detail['ETag']).status_code, 200)
+        self.assertEqual(len(lessons.data['results']), 2)
+
+    def test_enrollment_invalidates(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_user('student').subscription.courses.add(self.course)
+
+        self.assertEqual(self.client.get(self.url).data['students_count'], 1)
+
+    def test_version_of_a_missing_course_expires(self):
+        version = get_course_version(0)
+        self.assertEqual(get_course_version(0), version)
+
+        later = time.time() + settings.COURSE_CACHE_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertGreater(get_course_version(0), version)
+
+    def test_if_modified_since_is_not_enough_for_not_modified(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_user('student').subscription.courses.add(self.course)
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['students_count'], 1)
+
+
+class LessonOrderTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course = create_course(self.author, lessons=4)
+        self.lessons = list(self.course.lessons.all())
+
+    def move(self, lesson, after):
+        url = reverse('lesson-move', args=[self.course.pk, lesson.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, {'after': after and after.pk}, format='json')
+
+    def syllabus(self):
+        response = self.client.get(reverse('course-syllabus', args=[self.course.pk]))
+        self.assertEqual(response.status_code, 200)
+        return [lesson['title'] for lesson in response.data]
+
+    def test_admin_cannot_move_a_lesson_to_another_course(self):
+        other = create_course(self.author, title='Other', lessons=1)
+        admin_user = create_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+        lesson = self.lessons[0]
+
+        response = self.client.post(reverse('admin:courses_lesson_change', args=[lesson.pk]), {
+            'title': 'Renamed', 'course': other.pk, 'video_url': lesson.video_url,
+        })
+
+        self.assertEqual(response.status_code, 302)
+        lesson.refresh_from_db()
+        self.assertEqual((lesson.title, lesson.course_id), ('Renamed', self.course.pk))
+        self.assertEqual(list(other.lessons.values_list('position', flat=True)), [1024])
+
+    def test_new_lessons_go_last(self):
+        self.assertEqual([lesson.position for lesson in self.lessons], [1024, 2048, 3072, 4096])
+        response = self.client.get(reverse('lesson-list', args=[self.course.pk]))
+        self.assertEqual([lesson['title'] for lesson in response.data['results']], ['Lesson 0', 'Lesson 1', 'Lesson 2', 'Lesson 3'])
+
+    def test_move_writes_one_lesson(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.move(self.lessons[3], after=self.lessons[0])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['position'], 1536)
+        updates = [query for query in ctx.captured_queries if query['sql'].startswith('UPDATE "courses_lesson"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.syllabus(), ['Lesson 0', 'Lesson 3', 'Lesson 1', 'Lesson 2'])
+
+    def test_move_first_and_last(self):
+        self.move(self.lessons[2], after=None)
+        self.move(self.lessons[0], after=self.lessons[3])
+        self.assertEqual(self.syllabus(), ['Lesson 2', 'Lesson 1', 'Lesson 3', 'Lesson 0'])
+
+    def test_used_up_gap_renumbers_the_course(self):
+        first, second = self.lessons[2], self.lessons[3]
+        # Every move halves the gap in front of the course
+        for _ in range(12):
+            self.move(first, after=None)
+            first, second = second, first
+
+        positions = list(self.course.lessons.values_list('position', flat=True))
+        self.assertEqual(len(set(positions)), 4)
+        self.assertEqual(self.syllabus(), ['Lesson 3', 'Lesson 2', 'Lesson 0', 'Lesson 1'])
+
+    def test_lesson_update_keeps_a_concurrent_move(self):
+        lesson = Lesson.objects.get(pk=self.lessons[0].pk)
+        self.move(self.lessons[0], after=self.lessons[2])
+
+        lesson.title = 'Renamed'
+        lesson.save()
+
+        self.assertEqual(self.syllabus(), ['Lesson 1', 'Lesson 2', 'Renamed', 'Lesson 3'])
+
+    def test_after_must_be_in_the_course(self):
+        other = create_course(self.author, lessons=1).lessons.get()
+        self.assertEqual(self.move(self.lessons[0], after=other).status_code, 400)
+        self.assertEqual(self.move(self.lessons[0], after=self.lessons[0]).status_code, 400)
+
+    def test_only_author_moves(self):
+        self.client.force_authenticate(create_user('other'))
+        self.assertEqual(self.move(self.lessons[0], after=self.lessons[1]).status_code, 403)
+
+    def test_syllabus_is_cached(self):
+        url = reverse('course-syllabus', args=[self.course.pk])
+        first = self.client.get(url)
+        self.assertEqual(list(first.data[0]), ['id', 'title', 'position'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertFalse([query for query in ctx.captured_queries if 'courses_' in query['sql']])
+
+        self.move(self.lessons[0], after=self.lessons[1])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        self.assertEqual(self.syllabus(), ['Lesson 1', 'Lesson 0', 'Lesson 2', 'Lesson 3'])
+
+    def test_missing_course(self):
+        self.assertEqual(self.client.get(reverse('course-syllabus', args=[0])).status_code, 404)
+
+
+class CourseCounterTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = create_course(self.author, lessons=2)
+
+    def test_lesson_counter(self):
+        self.course.lessons.first().delete()
+        Lesson.objects.create(title='New', course=self.course, video_url='https://example.com/video')
+        Lesson.objects.create(title='Newer', course=self.course, video_url='https://example.com/video')
+
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.lessons_count, 3)
+
+    def test_student_counter(self):
+        students = [create_user(f'student{i}') for i in range(3)]
+        for student in students:
+            student.subscription.courses.add(self.course)
+        students[0].subscription.courses.add(self.course)
+        students[1].subscription.courses.remove(self.course)
+
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.students_count, 2)
+
+    def test_counters_are_read_without_queries(self):
+        course = Course.objects.get(pk=self.course.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(course.get_lessons_count, 2)
+            self.assertEqual(course.get_student_count, 0)
+
+    def test_save_keeps_concurrent_counts(self):
+        course = Course.objects.get(pk=self.course.pk)
+        create_user('student').subscription.courses.add(self.course)
+
+        response = self.client.patch(reverse('course-detail', args=[course.pk]), {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['students_count'], 1)
+
+        course.price = 20
+        course.save()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.price, 20)
+        self.assertEqual((self.course.students_count, self.course.lessons_count), (1, 2))
+
+    def test_lesson_cannot_change_course(self):
+        other = create_course(self.author, title='Other', lessons=1)
+        lesson = self.course.lessons.first()
+        url = reverse('lesson-detail', args=[self.course.pk, lesson.pk])
+
+        response = self.client.patch(url, {'course': other.pk, 'title': 'Renamed'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['course'], self.course.pk)
+        lesson.refresh_from_db()
+        self.assertEqual(lesson.course_id, self.course.pk)
+        self.course.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.course.lessons_count, other.lessons_count), (2, 1))
+
+    def delete_queries(self, students, lessons):
+        course = create_course(self.author, title=f'{students} students', lessons=lessons)
+        for i in range(students):
+            create_user(f'{course.pk}-student{i}').subscription.courses.add(course)
+
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        return len(ctx.captured_queries)
+
+    def test_course_delete_queues_no_progress_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.delete()
+        self.assertFalse(Job.objects.exists())
+
+    def test_course_delete_does_not_count_its_cascade(self):
+        self.assertEqual(self.delete_queries(students=2, lessons=2), self.delete_queries(students=6, lessons=6))
+
+    def test_recount_repairs_drift(self):
+        create_user('student').subscription.courses.add(self.course)
+        other = create_course(self.author, lessons=1)
+        Course.objects.filter(pk=self.course.pk).update(students_count=7, lessons_count=0)
+
+        out = StringIO()
+        call_command('recount_courses', batch_size=1, stdout=out)
+
+        self.course.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.course.students_count, self.course.lessons_count), (1, 2))
+        self.assertEqual((other.students_count, other.lessons_count), (0, 1))
+        self.assertIn('Repaired 1 of 2', out.getvalue())
+
+
+class EnrollCourseTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = create_course(self.author, price=300)
+        self.student = create_user('student')
+        self.client.force_authenticate(self.student)
+        self.url = reverse('enroll-course', args=[self.course.pk])
+
+    def test_enroll_charges_once(self):
+        first = self.client.post(self.url)
+        second = self.client.post(self.url)
+
+        self.student.balance.refresh_from_db()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(self.student.balance.points, 700)
+        self.assertEqual(SubscriptionCourse.objects.filter(course=self.course).count(), 1)
+
+    def test_not_enough_points(self):
+        self.student.balance.points = 100
+        self.student.balance.save()
+
+        response = self.client.post(self.url)
+
+        self.student.balance.refresh_from_db()
+        self.assertEqual(response.status_code, 402)
+        self.assertEqual(self.student.balance.points, 100)
+        self.assertFalse(SubscriptionCourse.objects.exists())
+
+
+class EnrollmentLookupTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.courses = [create_course(self.author, title=f'Course {i}') for i in range(3)]
+        self.student = create_user('student')
+        self.student.subscription.courses.add(self.courses[0])
+
+    def test_batch_lookup_is_one_query_then_cached(self):
+        ids = [course.pk for course in self.courses]
+
+        with self.assertNumQueries(1):
+            self.assertEqual(enrolled_course_ids(self.student, ids), {self.courses[0].pk})
+
+        student = resolve_user(self.student.pk)
+        enrolled_course_ids(student, ids)
+        with self.assertNumQueries(0):
+            self.assertEqual(enrolled_course_ids(student, ids[1:]), set())
+
+    def test_cached_set_is_read_from_the_primary(self):
+        student = resolve_user(self.student.pk)
+        # Any read routed to the replica fails, there is no such database here
+        with replica_reads(), mock.patch.object(ReplicaRouter, 'db_for_read', return_value='replica'):
+            self.assertEqual(enrolled_course_ids(student, [self.courses[0].pk]), {self.courses[0].pk})
+
+    def test_enroll_and_unenroll_invalidate(self):
+        student = resolve_user(self.student.pk)
+        course = self.courses[1]
+        self.assertFalse(enrolled_course_ids(student, [course.pk]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enroll(student, course)
+        self.assertEqual(enrolled_course_ids(student, [course.pk]), {course.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SubscriptionCourse.objects.get(subscription_id=student.subscription_pk, course=course).delete()
+        self.assertFalse(enrolled_course_ids(student, [course.pk]))
+
+    def test_course_delete_invalidates(self):
+        student = resolve_user(self.student.pk)
+        course = self.courses[0]
+        self.assertEqual(enrolled_course_ids(student, [course.pk]), {course.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        self.assertFalse(enrolled_course_ids(student, [course.pk]))
+
+    def test_list_flags_enrolled_courses(self):
+        self.client.force_authenticate(self.student)
+
+        results = self.client.get(reverse('course-list')).data['results']
+
+        self.assertEqual(
+            {course['id'] for course in results if course['is_enrolled']},
+            {self.courses[0].pk},
+        )
+
+    def test_cached_detail_is_per_user(self):
+        url = reverse('course-detail', args=[self.courses[0].pk])
+        self.client.force_authenticate(self.student)
+        enrolled = self.client.get(url)
+
+        self.client.force_authenticate(self.author)
+        other = self.client.get(url)
+
+        self.assertTrue(enrolled.data['is_enrolled'])
+        self.assertFalse(other.data['is_enrolled'])
+        self.assertEqual(enrolled['ETag'], other['ETag'])
+
+
+class BulkEnrollTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = create_course(self.author, price=300)
+        self.url = reverse('bulk-enroll-course', args=[self.course.pk])
+
+    def test_reports_each_user(self):
+        enrolled = create_user('enrolled')
+        enrolled.subscription.courses.add(self.course)
+        poor = create_user('poor')
+        poor.balance.points = 10
+        poor.balance.save()
+        fresh = create_user('fresh')
+
+        response = self.client.post(self.url, {'user_ids': [fresh.pk, enrolled.pk, poor.pk, 0]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['enrolled'], [fresh.pk])
+        self.assertEqual(
+            {failure['user_id']: failure['detail'] for failure in response.data['failed']},
+            {enrolled.pk: 'Already enrolled in this course', poor.pk: 'Not enough points', 0: 'User not found'},
+        )
+        fresh.balance.refresh_from_db()
+        self.course.refresh_from_db()
+        self.assertEqual(fresh.balance.points, 700)
+        self.assertEqual(self.course.students_count, 2)
+
+    def test_group_query_count_is_constant(self):
+        small = Group.objects.create(name='Small', course=self.course)
+        small.members.add(create_user('first'))
+        large = Group.objects.create(name='Large', course=self.course)
+        large.members.add(*[create_user(f'member{i}') for i in range(20)])
+
+        with CaptureQueriesContext(connection) as small_ctx:
+            self.client.post(self.url, {'group_id': small.pk}, format='json')
+        with CaptureQueriesContext(connection) as large_ctx:
+            response = self.client.post(self.url, {'group_id': large.pk}, format='json')
+
+        self.assertEqual(len(response.data['enrolled']), 20)
+        self.assertEqual(len(small_ctx.captured_queries), len(large_ctx.captured_queries))
+
+    def test_group_is_capped_like_user_ids(self):
+        group = Group.objects.create(name='Large', course=self.course)
+        group.members.add(*[create_user(f'member{i}') for i in range(3)])
+
+        with mock.patch('api.v1.courses.views.BULK_ENROLL_LIMIT', 2):
+            response = self.client.post(self.url, {'group_id': group.pk}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SubscriptionCourse.objects.filter(course=self.course).exists())
+
+    def test_only_author(self):
+        self.client.force_authenticate(create_user('student'))
+
+        response = self.client.post(self.url, {'user_ids': []}, format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_requires_one_source(self):
+        response = self.client.post(self.url, {}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ConcurrentEnrollmentTest(TransactionTestCase):
+    def attempt(self, user, course):
+        try:
+            enroll(user, course)
+            return True
+        except EnrollmentError:
+            return False
+        finally:
+            connection.close()
+
+    def run_in_parallel(self, user, courses):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            return list(pool.map(lambda course: self.attempt(user, course), courses))
+
+    def test_parallel_clicks_enroll_once(self):
+        author = create_user('author')
+        student = create_user('student')
+        course = create_course(author, price=100)
+
+        results = self.run_in_parallel(student, [course] * 16)
+
+        student.balance.refresh_from_db()
+        debits = PointsEntry.objects.filter(user=student, kind=PointsEntry.ENROLLMENT)
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(SubscriptionCourse.objects.filter(course=course).count(), 1)
+        self.assertEqual(list(debits.values_list('amount', flat=True)), [-100])
+        self.assertEqual(student.balance.points, 900)
+
+    def test_parallel_enrollments_never_overdraw(self):
+        author = create_user('author')
+        student = create_user('student')
+        courses = [create_course(author, title=f'Course {i}', price=400) for i in range(8)]
+
+        results = self.run_in_parallel(student, courses)
+
+        student.balance.refresh_from_db()
+        debits = PointsEntry.objects.filter(user=student, kind=PointsEntry.ENROLLMENT)
+        self.assertEqual(results.count(True), 2)
+        self.assertEqual(SubscriptionCourse.objects.filter(subscription__user=student).count(), 2)
+        self.assertEqual(list(debits.values_list('amount', flat=True)), [-400, -400])
+        self.assertEqual(student.balance.points, 200)
+
+
+class LessonProgressTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = create_course(self.author, lessons=4)
+        self.student = create_user('student')
+        self.student.subscription.courses.add(self.course)
+        self.client.force_authenticate(self.student)
+        self.lessons = list(self.course.lessons.order_by('pk'))
+
+    def complete(self, lesson):
+        return self.client.post(reverse('lesson-complete', args=[self.course.pk, lesson.pk]))
+
+    def progress(self):
+        return SubscriptionCourse.objects.get(subscription__user=self.student, course=self.course)
+
+    def test_completion_updates_progress(self):
+        self.assertEqual(self.complete(self.lessons[0]).status_code, 200)
+        self.complete(self.lessons[0])
+        self.complete(self.lessons[1])
+
+        progress = self.progress()
+        self.assertEqual(progress.completed_lessons_count, 2)
+        self.assertEqual(progress.completed_percentage, 50)
+        self.assertIsNone(progress.ended_at)
+
+    def test_last_lesson_ends_course(self):
+        for lesson in self.lessons:
+            self.complete(lesson)
+
+        progress = self.progress()
+        self.assertEqual(progress.completed_percentage, 100)
+        self.assertIsNotNone(progress.ended_at)
+
+    def test_new_lesson_queues_one_update_of_every_subscription(self):
+        create_user('other').subscription.courses.add(self.course)
+        self.complete(self.lessons[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(title='New', course=self.course, video_url='https://example.com/video')
+        with CaptureQueriesContext(connection) as ctx:
+            run_pending()
+
+        self.assertEqual(self.progress().completed_percentage, 20)
+        self.assertEqual(len([query for query in ctx.captured_queries if 'UPDATE "courses_subscriptioncourse"' in query['sql']]), 1)
+
+    def test_deleted_lesson_is_uncounted(self):
+        self.complete(self.lessons[0])
+        self.complete(self.lessons[1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lessons[0].delete()
+        run_pending()
+
+        progress = self.progress()
+        self.assertEqual(progress.completed_lessons_count, 1)
+        self.assertAlmostEqual(float(progress.completed_percentage), 33.33, places=2)
+
+    def test_not_enrolled(self):
+        self.client.force_authenticate(create_user('stranger'))
+
+        self.assertEqual(self.complete(self.lessons[0]).status_code, 403)
+
+
+class LessonCompletionBatchTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = create_course(self.author, lessons=4)
+        self.other = create_course(self.author, lessons=2)
+        self.student = create_user('student')
+        self.student.subscription.courses.add(self.course)
+        self.client.force_authenticate(self.student)
+        self.lessons = list(self.course.lessons.order_by('pk'))
+        self.url = reverse('lesson-complete-batch')
+
+    def sync(self, lessons):
+        return self.client.post(
+            self.url, {'completions': [{'lesson_id': lesson_id, 'score': 50} for lesson_id in lessons]}, format='json',
+        )
+
+    def test_reports_each_lesson(self):
+        self.client.post(reverse('lesson-complete', args=[self.course.pk, self.lessons[0].pk]))
+        other_lesson = self.other.lessons.first()
+
+        response = self.sync([self.lessons[0].pk, self.lessons[1].pk, self.lessons[1].pk, other_lesson.pk, 0])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['status'] for item in response.data],
+            ['already_completed', 'completed', 'already_completed', 'not_enrolled', 'not_found'],
+        )
+        progress = SubscriptionCourse.objects.get(course=self.course)
+        self.assertEqual(progress.completed_lessons_count, 2)
+        self.assertEqual(progress.completed_percentage, 50)
+        self.assertIsNone(progress.ended_at)
+
+    def test_finishes_the_course(self):
+        self.sync([lesson.pk for lesson in self.lessons])
+
+        progress = SubscriptionCourse.objects.get(course=self.course)
+        self.assertEqual(progress.completed_percentage, 100)
+        self.assertIsNotNone(progress.ended_at)
+        self.assertEqual(CompletedLesson.objects.filter(subscription_course=progress, score=50).count(), 4)
+
+    def test_keeps_the_client_completion_time(self):
+        offline = timezone.now() - timedelta(days=2)
+        response = self.client.post(self.url, {'completions': [
+            {'lesson_id': self.lessons[0].pk, 'completed_at': offline.isoformat()},
+            {'lesson_id': self.lessons[1].pk, 'completed_at': (timezone.now() + timedelta(days=1)).isoformat()},
+            {'lesson_id': self.lessons[2].pk},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        completions = {c.lesson_id: c for c in CompletedLesson.objects.all()}
+        self.assertEqual(completions[self.lessons[0].pk].client_completed_at, offline)
+        # Stored at sync time, so the analytics watermark still sees it
+        self.assertGreater(completions[self.lessons[0].pk].completed_at, offline)
+        self.assertLessEqual(
+            completions[self.lessons[1].pk].client_completed_at, completions[self.lessons[1].pk].completed_at,
+        )
+        self.assertIsNone(completions[self.lessons[2].pk].client_completed_at)
+
+    def test_query_count_is_constant(self):
+        self.student.subscription.courses.add(self.other)
+        lessons = [lesson.pk for lesson in self.lessons[1:]] + list(self.other.lessons.values_list('pk', flat=True))
+        with CaptureQueriesContext(connection) as few:
+            self.sync([self.lessons[0].pk])
+        with CaptureQueriesContext(connection) as many:
+            self.sync(lessons)
+
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        self.assertEqual(SubscriptionCourse.objects.get(course=self.other).completed_lessons_count, 2)
+
+    def test_rejects_empty_batch(self):
+        response = self.client.post(self.url, {'completions': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class GroupMembersTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = create_course(self.author)
+        self.group = Group.objects.create(name='Group', course=self.course)
+        self.users = [create_user(f'member{i}') for i in range(5)]
+        self.url = reverse('group-members', args=[self.course.pk, self.group.pk])
+
+    def members_count(self):
+        return Group.objects.values_list('members_count', flat=True).get(pk=self.group.pk)
+
+    def test_add_reports_each_user(self):
+        self.group.members.add(self.users[0])
+
+        response = self.client.post(self.url, {'user_ids': [self.users[1].pk, self.users[0].pk, 0]}, format='json')
+
+        self.assertEqual(response.data['added'], [self.users[1].pk])
+        self.assertEqual(
+            {failure['user_id']: failure['detail'] for failure in response.data['failed']},
+            {self.users[0].pk: 'Already a member of this group', 0: 'User not found'},
+        )
+        self.assertEqual(self.members_count(), 2)
+
+    def test_add_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(self.url, {'user_ids': [self.users[0].pk]}, format='json')
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(self.url, {'user_ids': [user.pk for user in self.users[1:]]}, format='json')
+
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        self.assertEqual(self.members_count(), 5)
+
+    def test_remove(self):
+        self.group.members.add(*self.users[:3])
+        url = reverse('group-members-remove', args=[self.course.pk, self.group.pk])
+
+        response = self.client.post(url, {'user_ids': [self.users[0].pk, self.users[4].pk]}, format='json')
+
+        self.assertEqual(response.data['removed'], [self.users[0].pk])
+        self.assertEqual(response.data['failed'], [{'user_id': self.users[4].pk, 'detail': 'Not a member of this group'}])
+        self.assertEqual(self.members_count(), 2)
+
+    def test_list_is_paginated(self):
+        self.group.members.add(*self.users)
+
+        first = self.client.get(self.url, {'page_size': 3}).data
+        second = self.client.get(first['next']).data
+
+        ids = [member['id'] for member in first['results'] + second['results']]
+        self.assertEqual(ids, sorted((user.pk for user in self.users), reverse=True))
+
+    def test_only_author_changes_members(self):
+        self.client.force_authenticate(self.users[0])
+
+        response = self.client.post(self.url, {'user_ids': [self.users[0].pk]}, format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_count_follows_every_membership_change(self):
+        self.group.members.add(*self.users)
+        self.group.members.remove(self.users[0], create_user('stranger'))
+        self.assertEqual(self.members_count(), 4)
+
+        self.users[1].group_set.clear()
+        self.users[2].delete()
+        self.assertEqual(self.members_count(), 2)
+
+        self.group.members.clear()
+        self.assertEqual(self.members_count(), 0)
+
+    def test_update_keeps_concurrent_count(self):
+        group = Group.objects.get(pk=self.group.pk)
+        self.group.members.add(*self.users[:2])
+
+        group.name = 'Renamed'
+        group.save()
+
+        self.assertEqual(self.members_count(), 2)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).name, 'Renamed')
+
+    def test_str_does_not_query(self):
+        group = Group.objects.select_related('course__author').get(pk=self.group.pk)
+        with self.assertNumQueries(0):
+            str(group)
+
+
+class AdminChangelistTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = create_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+        # Caches the admin user, it is not read again by the requests measured
+        self.client.get(reverse('admin:index'))
+        self.courses = 0
+
+    def populate(self, courses):
+        for _ in range(courses):
+            self.courses += 1
+            course = create_course(self.author, title=f'Course {self.courses}', lessons=2)
+            student = create_user(f'student-{self.courses}')
+            enrollment = enroll(student, course)
+            CompletedLesson.objects.create(subscription_course=enrollment, lesson=course.lessons.first())
+            Group.objects.create(name=f'Group {self.courses}', course=course).members.add(student)
+
+    def changelist_queries(self):
+        counts = {}
+        for model in admin.site._registry:
+            if model._meta.app_label not in ('accounts', 'courses'):
+                continue
+            url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts[model._meta.model_name] = len(ctx.captured_queries)
+        return counts
+
+    def test_query_count_is_constant(self):
+        self.populate(1)
+        few = self.changelist_queries()
+
+        self.populate(20)
+        many = self.changelist_queries()
+
+        self.assertEqual(few, many)
+        self.assertIn('lesson', many)
+        self.assertIn('pointsentry', many)
+
+    def test_autocomplete_filter(self):
+        self.populate(3)
+        course = Course.objects.get(title='Course 2')
+        url = reverse('admin:courses_lesson_changelist')
+
+        response = self.client.get(url, {'course__id__exact': course.pk})
+
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertContains(response, f'<option value="{course.pk}" selected>{course}</option>', html=True)
+        self.assertNotContains(response, 'Course 3')
+
+    def test_autocomplete_searches_courses(self):
+        self.populate(3)
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'courses', 'model_name': 'lesson', 'field_name': 'course', 'term': 'Course 2',
+        })
+
+        self.assertEqual([result['text'] for result in response.json()['results']], [str(Course.objects.get(title='Course 2'))])
+
+
+class ProfilingTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        slow_requests.clear()
+        self.course = create_course(self.author, lessons=3)
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('course-list'))
+
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        # Course page and the user's enrollments
+        self.assertIn('desc="2 queries"', timing)
+        self.assertIn('serializer;dur=', timing)
+
+    @override_settings(PROFILING_SLOW_MS=0)
+    def test_duplicate_queries_are_reported(self):
+        with self.assertLogs('core.profiling', 'WARNING'):
+            self.client.get(reverse('course-detail', args=[self.course.pk]))
+        staff = create_user('staff', is_staff=True)
+        self.client.force_authenticate(staff)
+
+        with self.assertLogs('core.profiling', 'WARNING'):
+            profiles = self.client.get(reverse('slow-request-list')).data
+
+        self.assertEqual(profiles[-1]['view'], 'course-detail')
+        self.assertEqual(profiles[-1]['duplicates'], [])
+
+    def test_slow_requests_are_staff_only(self):
+        response = self.client.get(reverse('slow-request-list'))
+
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.client.get(reverse('course-list'))
+
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Reads SQLite EXPLAIN QUERY PLAN output')
+class IndexUsageTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = create_course(self.author, lessons=3)
+        self.student = create_user('student')
+        self.student.subscription.courses.add(self.course)
+        self.enrollment = SubscriptionCourse.objects.get(course=self.course)
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        # The index returns rows in order, no separate sort step
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_ordered_lessons_of_course(self):
+        self.assertUsesIndex(Lesson.objects.filter(course=self.course), 'lesson_course_position_idx')
+
+    def test_ordered_groups_of_course(self):
+        groups = Group.objects.filter(course=self.course).order_by('-created_at', '-id')
+        self.assertUsesIndex(groups, 'group_course_created_at_idx')
+
+    def test_enrollments_of_course(self):
+        self.assertUsesIndex(SubscriptionCourse.objects.filter(course=self.course), 'subscriptioncourse_course_idx')
+
+    # SQLite names unique constraint indexes sqlite_autoindex_*, match the
+    # columns searched instead
+
+    def test_enrollment_of_subscription(self):
+        courses = self.student.subscription.courses.filter(id=self.course.pk)
+        self.assertIn('(subscription_id=? AND course_id=?)', courses.explain())
+
+    def test_completion_lookup(self):
+        lesson = self.course.lessons.first()
+        completions = CompletedLesson.objects.filter(subscription_course=self.enrollment, lesson=lesson)
+        self.assertIn('(subscription_course_id=? AND lesson_id=?)', completions.explain())
+
+    def test_duplicate_completion_is_rejected(self):
+        lesson = self.course.lessons.first()
+        CompletedLesson.objects.create(subscription_course=self.enrollment, lesson=lesson)
+
+        with self.assertRaises(IntegrityError):
+            CompletedLesson.objects.create(subscription_course=self.enrollment, lesson=lesson)
+
+
+class CourseSearchTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python = create_course(self.author, title='Python for beginners')
+            self.django = create_course(self.author, title='Web development')
+            Lesson.objects.create(title='Python and Django', course=self.django, video_url='https://example.com/video')
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('course-search'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def titles(self, q):
+        return [course['title'] for course in self.search(q)['results']]
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.titles('python'), ['Python for beginners', 'Web development'])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.titles('python django'), ['Web development'])
+
+    def test_stemming(self):
+        self.assertEqual(self.titles('beginner'), ['Python for beginners'])
+
+    def test_author_name(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_course(create_user('guido', first_name='Guido', last_name='Rossum'), title='Other')
+        self.assertEqual(self.titles('rossum'), ['Other'])
+
+        guido = CustomUser.objects.get(username='guido')
+        guido.last_name = 'van Rossum'
+        guido.save()
+        self.assertEqual(self.titles('van rossum'), ['Other'])
+
+    def test_index_follows_lessons(self):
+        lesson = self.django.lessons.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.title = 'Flask'
+            lesson.save()
+        self.assertEqual(self.titles('python'), ['Python for beginners'])
+        self.assertEqual(self.titles('flask'), ['Web development'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.delete()
+        self.assertEqual(self.titles('flask'), [])
+
+    def test_deleted_course(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python.delete()
+        self.assertEqual(self.titles('python'), ['Web development'])
+
+    def test_pagination(self):
+        first = self.search('python', limit=1)
+        self.assertEqual([course['title'] for course in first['results']], ['Python for beginners'])
+        self.assertIsNone(first['previous'])
+
+        second = self.client.get(first['next']).data
+        self.assertEqual([course['title'] for course in second['results']], ['Web development'])
+        self.assertIsNone(second['next'])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.titles('python OR "NEAR(*'), [])
+        self.assertEqual(self.titles('***'), [])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get(reverse('course-search')).status_code, 400)
+
+    def test_rebuild_index(self):
+        CourseSearchDocument.objects.all().delete()
+        self.assertEqual(self.titles('python'), [])
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+
+        self.assertIn('Indexed 2 courses', out.getvalue())
+        self.assertEqual(self.titles('python'), ['Python for beginners', 'Web development'])
+
+
+def catalog(courses, lessons=2, offset=0):
+    return [
+        {
+            'title': f'Imported {offset + i}',
+            'price': '9.90',
+            'lessons': [{'title': f'Imported lesson {j}', 'video_url': 'https://example.com/video'} for j in range(lessons)],
+        }
+        for i in range(courses)
+    ]
+
+
+class CatalogImportTest(CourseAPITestCase):
+    def import_catalog(self, courses, **kwargs):
+        return self.client.post(reverse('course-import'), courses, format='json', **kwargs)
+
+    def test_json_array_is_read_in_chunks(self):
+        items = catalog(3, lessons=1)
+        read = list(read_json_array(BytesIO(json.dumps(items).encode()), chunk_size=7))
+        self.assertEqual([item['title'] for item in read], ['Imported 0', 'Imported 1', 'Imported 2'])
+
+        with self.assertRaises(CatalogError):
+            list(read_json_array(BytesIO(b'[{"title": "Cut"}'), chunk_size=7))
+
+    def test_upload_is_spooled_before_the_transaction(self):
+        body = json.dumps(catalog(2)).encode()
+        upload = BytesIO(body)
+        atomic = transaction.atomic
+
+        def read_already(*args, **kwargs):
+            self.assertEqual(upload.tell(), len(body))
+            return atomic(*args, **kwargs)
+
+        with spool(upload) as stream, mock.patch('courses.catalog.transaction.atomic', side_effect=read_already):
+            self.assertEqual(import_catalog(read_catalog(stream, JSON), self.author), (2, 4))
+
+    def test_import(self):
+        response = self.import_catalog(catalog(3, lessons=2))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'courses': 3, 'lessons': 6})
+        course = Course.objects.get(title='Imported 1')
+        self.assertEqual(course.author, self.author)
+        self.assertEqual(course.lessons_count, 2)
+        self.assertEqual(list(course.lessons.values_list('title', flat=True)), ['Imported lesson 0', 'Imported lesson 1'])
+        self.assertEqual(len(search_course_ids('imported', 10)), 3)
+
+    def test_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as few:
+            self.import_catalog(catalog(2))
+        with CaptureQueriesContext(connection) as many:
+            self.import_catalog(catalog(20, lessons=5, offset=2))
+
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(Course.objects.count(), 22)
+
+    def test_ndjson(self):
+        body = '\n'.join(json.dumps(course) for course in catalog(2)) + '\n'
+
+        response = self.client.post(reverse('course-import'), body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'courses': 2, 'lessons': 4})
+
+    def test_invalid_course_imports_nothing(self):
+        courses = catalog(3)
+        courses[1]['lessons'][0]['video_url'] = 'not a url'
+
+        response = self.import_catalog(courses)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['detail'], 'Course 2, lesson 1: video_url: Enter a valid URL.')
+        self.assertFalse(Course.objects.exists())
+
+    def test_unsupported_media_type(self):
+        response = self.client.post(reverse('course-import'), {'title': 'Form'})
+        self.assertEqual(response.status_code, 415)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'catalog.ndjson'
+            path.write_text('\n'.join(json.dumps(course) for course in catalog(4, lessons=3)))
+            out = StringIO()
+
+            call_command('import_catalog', str(path), author=self.author.email, batch_size=3, stdout=out)
+
+        self.assertIn('Imported 4 courses and 12 lessons', out.getvalue())
+        self.assertEqual(set(Course.objects.values_list('lessons_count', flat=True)), {3})
+
+    def test_clone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = create_course(self.author, title='Original', lessons=3)
+        lessons = list(course.lessons.values_list('title', 'video_url', 'position'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('course-clone', args=[course.pk]), {'title': 'Copy'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['lessons_count'], 3)
+        clone = Course.objects.get(pk=response.data['id'])
+        self.assertEqual(clone.title, 'Copy')
+        self.assertEqual(list(clone.lessons.values_list('title', 'video_url', 'position')), lessons)
+        self.assertEqual(course.lessons.count(), 3)
+        self.assertIn(clone.pk, search_course_ids('copy', 10))
+
+    def test_only_author_clones(self):
+        course = create_course(self.author, lessons=1)
+        self.client.force_authenticate(create_user('other'))
+
+        response = self.client.post(reverse('course-clone', args=[course.pk]))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Course.objects.count(), 1)
+
+
+class CourseExportTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = create_course(self.author, lessons=2)
+        self.lessons = list(self.course.lessons.order_by('pk'))
+        self.students = [create_user(f'student{i}') for i in range(3)]
+        for student in self.students:
+            student.subscription.courses.add(self.course)
+        self.enrollments = list(SubscriptionCourse.objects.filter(course=self.course).order_by('pk'))
+        CompletedLesson.objects.create(subscription_course=self.enrollments[0], lesson=self.lessons[0], score=80)
+        CompletedLesson.objects.create(subscription_course=self.enrollments[0], lesson=self.lessons[1], score=90)
+
+    def export(self, dataset, **params):
+        return self.client.get(reverse('course-export', args=[self.course.pk, dataset]), params)
+
+    def content(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_enrollments_csv(self):
+        response = self.export('enrollments')
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn(f'course-{self.course.pk}-enrollments.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(self.content(response))))
+        self.assertEqual([row['username'] for row in rows], ['student0', 'student1', 'student2'])
+        self.assertEqual(rows[0]['user_id'], str(self.students[0].pk))
+        self.assertEqual(rows[0]['ended_at'], '')
+
+    def test_completions_ndjson(self):
+        response = self.export('completions', output='ndjson')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([(row['lesson_title'], row['score']) for row in rows], [('Lesson 0', 80), ('Lesson 1', 90)])
+        self.assertEqual({row['username'] for row in rows}, {'student0'})
+
+    def test_date_range(self):
+        SubscriptionCourse.objects.filter(pk=self.enrollments[0].pk).update(started_at='2024-01-10T12:00:00Z')
+        SubscriptionCourse.objects.filter(pk=self.enrollments[1].pk).update(started_at='2024-02-01T00:00:00Z')
+
+        content = self.content(self.export('enrollments', since='2024-01-01', until='2024-01-31'))
+
+        self.assertEqual([row['username'] for row in csv.DictReader(StringIO(content))], ['student0'])
+
+    def test_rows_are_read_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.content(self.export('completions'))
+        # The permission check and the export itself
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    async def test_streams_without_buffering_under_asgi(self):
+        await self.async_client.aforce_login(self.author)
+
+        response = await self.async_client.get(reverse('course-export', args=[self.course.pk, 'enrollments']))
+
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual([row['username'] for row in csv.DictReader(StringIO(content))], ['student0', 'student1', 'student2'])
+
+    def test_author_only(self):
+        self.client.force_authenticate(self.students[0])
+        self.assertEqual(self.export('enrollments').status_code, 403)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.export('payments').status_code, 404)
+        self.assertEqual(self.export('enrollments', output='xml').status_code, 400)
+        self.assertEqual(self.export('enrollments', since='yesterday').status_code, 400)
+
+
+class CourseAnalyticsTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = create_course(self.author, lessons=2)
+        self.lessons = list(self.course.lessons.order_by('pk'))
+        for i in range(3):
+            create_user(f'student{i}').subscription.courses.add(self.course)
+        self.enrollments = list(SubscriptionCourse.objects.filter(course=self.course).order_by('pk'))
+        self.complete(self.enrollments[0], self.lessons[0], 60)
+        self.complete(self.enrollments[0], self.lessons[1], 80)
+        self.complete(self.enrollments[1], self.lessons[0], 100)
+        SubscriptionCourse.objects.filter(pk=self.enrollments[0].pk).update(ended_at=timezone.now())
+
+    def complete(self, enrollment, lesson, score):
+        CompletedLesson.objects.create(subscription_course=enrollment, lesson=lesson, score=score)
+
+    def analytics(self, **params):
+        response = self.client.get(reverse('course-analytics', args=[self.course.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_rollups(self):
+        rollup(until=timezone.now())
+        data = self.analytics()
+
+        self.assertEqual(data['enrollments'], 3)
+        self.assertEqual(data['completions'], 1)
+        self.assertEqual(data['completion_rate'], 33.33)
+        self.assertEqual(data['average_score'], 80)
+        self.assertEqual(len(data['daily']), 1)
+        self.assertEqual(data['daily'][0]['lesson_completions'], 3)
+        self.assertEqual(
+            [(lesson['completions'], lesson['completion_rate'], lesson['average_score']) for lesson in data['lessons']],
+            [(2, 66.67, 80), (1, 33.33, 80)],
+        )
+
+    def test_only_new_rows_are_added(self):
+        rollup(until=timezone.now())
+        self.assertIsNone(rollup(until=timezone.now() - timedelta(minutes=1)))
+
+        self.complete(self.enrollments[2], self.lessons[0], 40)
+        rollup(until=timezone.now())
+
+        data = self.analytics()
+        self.assertEqual(data['enrollments'], 3)
+        self.assertEqual(data['lessons'][0]['completions'], 3)
+        self.assertEqual(data['average_score'], 70)
+
+    def test_recent_rows_wait_for_the_lag(self):
+        call_command('rollup_analytics', stdout=StringIO())
+        self.assertEqual(self.analytics()['enrollments'], 0)
+
+        with override_settings(ANALYTICS_ROLLUP_LAG=-60):
+            call_command('rollup_analytics', stdout=StringIO())
+        self.assertEqual(self.analytics()['enrollments'], 3)
+
+    def test_daily_range(self):
+        day = timezone.now() - timedelta(days=3)
+        SubscriptionCourse.objects.filter(pk=self.enrollments[2].pk).update(started_at=day)
+        rollup(until=timezone.now())
+
+        data = self.analytics(since=timezone.localdate().isoformat())
+
+        self.assertEqual([stats['enrollments'] for stats in data['daily']], [2])
+        self.assertEqual(data['enrollments'], 3)
+
+    def test_query_count_does_not_depend_on_activity(self):
+        rollup(until=timezone.now())
+        with CaptureQueriesContext(connection) as ctx:
+            self.analytics()
+        # Course, totals, daily series, lessons and the watermark
+        self.assertEqual(len(ctx.captured_queries), 5)
+
+    def test_author_only(self):
+        self.client.force_authenticate(create_user('stranger'))
+        response = self.client.get(reverse('course-analytics', args=[self.course.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_date(self):
+        response = self.client.get(reverse('course-analytics', args=[self.course.pk]), {'since': 'monday'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='core.urls_asgi')
+class AsyncReadViewTest(CourseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course = create_course(self.author, lessons=3)
+
+    async def test_list_matches_sync_view(self):
+        await self.async_client.aforce_login(self.author)
+
+        response = await self.async_client.get(reverse('course-list'), {'page_size': 2})
+
+        self.assertEqual(response.status_code, 200)
+        with override_settings(ROOT_URLCONF='core.urls'):
+            expected = await sync_to_async(self.client.get)(reverse('course-list'), {'page_size': 2})
+        self.assertEqual(response.json(), expected.json())
+
+    async def test_detail_is_cached(self):
+        await self.async_client.aforce_login(self.author)
+        url = reverse('course-detail', args=[self.course.pk])
+
+        first = await self.async_client.get(url)
+        second = await self.async_client.get(url, headers={'if-none-match': first['ETag']})
+
+        self.assertEqual(first.json()['lessons_count'], 3)
+        self.assertEqual(second.status_code, 304)
+
+    async def test_lessons_are_paginated(self):
+        await self.async_client.aforce_login(self.author)
+        url = reverse('lesson-list', args=[self.course.pk])
+
+        first = (await self.async_client.get(url, {'page_size': 2})).json()
+        second = (await self.async_client.get(first['next'])).json()
+
+        self.assertEqual(len(first['results']) + len(second['results']), 3)
+        self.assertIsNone(second['next'])
+
+    async def test_missing_course(self):
+        await self.async_client.aforce_login(self.author)
+        response = await self.async_client.get(reverse('course-detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse('course-list'))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_queries_are_profiled(self):
+        await self.async_client.aforce_login(self.author)
+
+        response = await self.async_client.get(reverse('course-list'))
+
+        # Session, user, course page and enrollments, run on the sync_to_async thread
+        self.assertIn('desc="4 queries"', response['Server-Timing'])
+
+    def test_subclass_needs_an_async_aget(self):
+        with self.assertRaises(ImproperlyConfigured):
+            class SyncView(AsyncReadView):
+                api_view = CourseAPIView
+
+                def aget(self, request):
+                    pass
+
+    async def test_writes_use_the_sync_view(self):
+        await self.async_client.aforce_login(self.author)
+
+        response = await self.async_client.post(
+            reverse('course-list'), {'title': 'Async', 'price': 5}, content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await Course.objects.filter(title='Async').aexists())
@@ -0,0 +1,44 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from jobs.queue import run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs on a thread or process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Worker threads')
+        parser.add_argument('--processes', type=int, default=0, help='Worker processes, used instead of threads when set')
+        parser.add_argument('--batch-size', type=int, default=100, help='Jobs claimed per poll')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Run the due jobs once and exit')
+
+    def handle(self, *args, threads, processes, batch_size, poll_interval, once, **options):
+        if processes:
+            # Spawned processes set Django up again instead of sharing our connections
+            executor = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=threads)
+
+        self.stdout.write(f'Worker started with {processes or threads} {"processes" if processes else "threads"}')
+        with executor:
+            try:
+                while True:
+                    ran = run_pending(batch_size, executor)
+                    if ran:
+                        self.stdout.write(f'Ran {ran} jobs')
+                    if once:
+                        break
+                    if not ran:
+                        time.sleep(poll_interval)
+            except KeyboardInterrupt:
+                self.stdout.write('Worker stopped')
@@ -0,0 +1,136 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__name__}'
+
+
+def task(func):
+    '''
+    Register a function so it can be queued with ``enqueue``
+    '''
+    registry[task_name(func)] = func
+    return func
+
+
+def enqueue(func, idempotency_key=None, delay=0, **kwargs):
+    '''
+    Queue ``func(**kwargs)`` once the current transaction commits. While a job
+    with the same ``idempotency_key`` is pending no other one is queued.
+    '''
+    name = task_name(func)
+    if name not in registry:
+        raise ValueError(f'{name} is not a registered task')
+    transaction.on_commit(lambda: create_job(name, kwargs, idempotency_key, delay))
+
+
+def create_job(name, kwargs, idempotency_key=None, delay=0):
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name,
+                kwargs=kwargs,
+                idempotency_key=idempotency_key,
+                run_at=timezone.now() + timedelta(seconds=delay),
+                max_attempts=settings.JOBS_MAX_ATTEMPTS,
+            )
+    except IntegrityError:
+        return None
+
+
+def claim_jobs(limit):
+    '''
+    Mark up to ``limit`` due jobs as running and return their ids. Jobs left
+    running by a dead worker are picked up again after JOBS_STALE_AFTER.
+    '''
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_STALE_AFTER)
+    candidates = (
+        Job.objects.filter(Q(status=Job.PENDING, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale))
+        .order_by('run_at')
+        .values_list('pk', 'status', 'locked_at')[:limit]
+    )
+    claimed = []
+    for pk, status, locked_at in candidates:
+        # Only one worker's UPDATE can match the row it read
+        if Job.objects.filter(pk=pk, status=status, locked_at=locked_at).update(
+            status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1
+        ):
+            claimed.append(pk)
+    return claimed
+
+
+def retry_delay(attempts):
+    return min(settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOBS_RETRY_BACKOFF_MAX)
+
+
+def run_job(pk):
+    job = Job.objects.get(pk=pk)
+    try:
+        registry[job.name](**job.kwargs)
+    except Exception:
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.name, job.attempts)
+        fail_job(job, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=pk).update(status=Job.DONE, locked_at=None, last_error='')
+    return True
+
+
+def run_job_in_worker(pk):
+    '''
+    run_job for pool threads and processes, which own their connections
+    '''
+    close_old_connections()
+    try:
+        return run_job(pk)
+    except Exception:
+        # Bookkeeping failed, the job stays running until it is reclaimed as stale
+        logger.exception('Job %s could not be run', pk)
+        return False
+    finally:
+        close_old_connections()
+
+
+def fail_job(job, error):
+    jobs = Job.objects.filter(pk=job.pk)
+    if job.attempts < job.max_attempts:
+        try:
+            with transaction.atomic():
+                jobs.update(
+                    status=Job.PENDING,
+                    locked_at=None,
+                    last_error=error,
+                    run_at=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+                )
+            return
+        except IntegrityError:
+            # A job with the same key was queued meanwhile and will redo the work
+            pass
+    jobs.update(status=Job.FAILED, locked_at=None, last_error=error)
+
+
+def run_pending(limit=100, executor=None):
+    '''
+    Claim and run due jobs, in ``executor`` when given. Returns how many ran.
+    '''
+    claimed = claim_jobs(limit)
+    if executor is None:
+        for pk in claimed:
+            run_job(pk)
+    else:
+        list(executor.map(run_job_in_worker, claimed))
+    return len(claimed)
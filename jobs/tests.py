@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import task, enqueue, create_job, claim_jobs, run_pending
+
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task
+def explode():
+    raise RuntimeError('boom')
+
+
+class EnqueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_job_is_created_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            enqueue(record, value=1)
+            self.assertFalse(Job.objects.exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Job.objects.get().kwargs, {'value': 1})
+
+    def test_idempotency_key_coalesces_pending_jobs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(record, idempotency_key='record', value=1)
+            enqueue(record, idempotency_key='record', value=2)
+
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(record, idempotency_key='record', value=3)
+        run_pending()
+        self.assertEqual(calls, [1, 3])
+
+    def test_unregistered_function(self):
+        with self.assertRaises(ValueError):
+            enqueue(print)
+
+
+class RetryTest(TestCase):
+    @override_settings(JOBS_RETRY_BACKOFF=10)
+    def test_failed_job_backs_off(self):
+        job = create_job('jobs.tests.explode', {})
+
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(run_pending(), 0)
+
+    def test_gives_up_after_max_attempts(self):
+        job = create_job('jobs.tests.explode', {})
+        Job.objects.filter(pk=job.pk).update(max_attempts=1)
+
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_stale_running_job_is_reclaimed(self):
+        job = create_job('jobs.tests.record', {'value': 1})
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, locked_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(claim_jobs(10), [job.pk])
+
+
+class WorkerPoolTest(TransactionTestCase):
+    def test_runs_jobs_in_executor(self):
+        calls.clear()
+        for value in range(20):
+            create_job('jobs.tests.record', {'value': value})
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while run_pending(5, executor):
+                pass
+
+        self.assertEqual(sorted(calls), list(range(20)))
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 20)
+
+    def test_job_is_claimed_once(self):
+        job = create_job('jobs.tests.record', {'value': 1})
+
+        self.assertEqual(claim_jobs(10), [job.pk])
+        self.assertEqual(claim_jobs(10), [])